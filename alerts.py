@@ -0,0 +1,163 @@
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+EXPIRY_WINDOW_DAYS = 90
+LOW_STOCK_THRESHOLD = 10
+ALERT_INTERVAL_SECONDS = 30
+
+# inventory_changes is a queue of inventory ids written since the last check,
+# so each run only looks at rows that actually changed.
+ALERT_SCHEMA = '''
+CREATE INDEX IF NOT EXISTS idx_inventory_exp_date ON inventory (exp_date);
+
+CREATE TABLE IF NOT EXISTS inventory_changes
+    (inventory_id INTEGER PRIMARY KEY);
+
+CREATE TABLE IF NOT EXISTS inventory_alerts
+    (inventory_id INTEGER,
+     kind TEXT,
+     medicine_name TEXT,
+     batch_no TEXT,
+     exp_date DATE,
+     quantity INTEGER,
+     PRIMARY KEY (inventory_id, kind));
+
+CREATE TABLE IF NOT EXISTS alert_state
+    (key TEXT PRIMARY KEY,
+     value TEXT);
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_changes_insert AFTER INSERT ON inventory
+BEGIN
+    INSERT OR IGNORE INTO inventory_changes (inventory_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_changes_update
+AFTER UPDATE OF medicine_name, batch_no, quantity, exp_mfg_date ON inventory
+BEGIN
+    INSERT OR IGNORE INTO inventory_changes (inventory_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_changes_delete AFTER DELETE ON inventory
+BEGIN
+    INSERT OR IGNORE INTO inventory_changes (inventory_id) VALUES (OLD.id);
+END;
+'''
+
+ALERT_ROWS = '''
+INSERT INTO inventory_alerts (inventory_id, kind, medicine_name, batch_no, exp_date, quantity)
+SELECT id, CASE WHEN exp_date < :today THEN 'expired' ELSE 'expiring' END,
+       medicine_name, batch_no, exp_date, quantity
+FROM inventory
+WHERE {where} AND exp_date <= :horizon AND quantity > 0
+UNION ALL
+SELECT id, 'low_stock', medicine_name, batch_no, exp_date, quantity
+FROM inventory
+WHERE {where} AND quantity <= :low_stock
+'''
+
+
+def init_alerts(conn):
+    """
+    Add the normalized exp_date column to inventory and the alert bookkeeping tables.
+
+    exp_date is a virtual generated column over exp_mfg_date, so it never needs
+    to be written by the app and is indexed for range scans on the expiry window.
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_xinfo(inventory)")]
+    if "exp_date" not in columns:
+        conn.execute("ALTER TABLE inventory ADD COLUMN exp_date DATE "
+                     "GENERATED ALWAYS AS (date(exp_mfg_date)) VIRTUAL")
+    existing = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='inventory_changes'"
+    ).fetchone()
+    conn.executescript(ALERT_SCHEMA)
+    if not existing:
+        # First run checks every row once, later runs only the changed ones
+        conn.execute("INSERT OR IGNORE INTO inventory_changes (inventory_id) SELECT id FROM inventory")
+    conn.commit()
+
+
+def run_checks(conn, today=None):
+    """
+    Refresh inventory_alerts for rows changed since the last run.
+
+    Once a day the rows whose exp_date moved into the expiry window (or past
+    today) are rechecked as well, using the exp_date index rather than a scan.
+    Returns the number of rows rechecked.
+    """
+    today = today or date.today()
+    params = {
+        "today": today.isoformat(),
+        "horizon": (today + timedelta(days=EXPIRY_WINDOW_DAYS)).isoformat(),
+        "low_stock": LOW_STOCK_THRESHOLD,
+    }
+    checked = 0
+
+    # BEGIN IMMEDIATE holds off writers so no change is dropped between
+    # reading the queue and clearing it
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        changed = "id IN (SELECT inventory_id FROM inventory_changes)"
+        checked += conn.execute("SELECT COUNT(*) FROM inventory_changes").fetchone()[0]
+        conn.execute("DELETE FROM inventory_alerts WHERE inventory_id IN (SELECT inventory_id FROM inventory_changes)")
+        conn.execute(ALERT_ROWS.format(where=changed), params)
+        conn.execute("DELETE FROM inventory_changes")
+
+        row = conn.execute("SELECT value FROM alert_state WHERE key = 'last_sweep'").fetchone()
+        last_sweep = row[0] if row else None
+        if last_sweep != params["today"]:
+            # Rows between the previous sweep and the new horizon are the only
+            # ones whose expired/expiring status can have changed with the date
+            params["since"] = last_sweep or "0000-01-01"
+            window = "exp_date BETWEEN :since AND :horizon"
+            checked += conn.execute(f"SELECT COUNT(*) FROM inventory WHERE {window}", params).fetchone()[0]
+            conn.execute('''DELETE FROM inventory_alerts
+                            WHERE inventory_id IN (SELECT id FROM inventory WHERE exp_date BETWEEN :since AND :horizon)''',
+                         params)
+            conn.execute(ALERT_ROWS.format(where=window), params)
+            conn.execute("INSERT OR REPLACE INTO alert_state (key, value) VALUES ('last_sweep', ?)",
+                         (params["today"],))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return checked
+
+
+def get_alerts(conn, limit=50):
+    return conn.execute('''SELECT kind, medicine_name, batch_no, exp_date, quantity
+                           FROM inventory_alerts
+                           ORDER BY CASE kind WHEN 'expired' THEN 0 WHEN 'expiring' THEN 1 ELSE 2 END,
+                                    exp_date, quantity
+                           LIMIT ?''', (limit,)).fetchall()
+
+
+def count_alerts(conn):
+    return conn.execute("SELECT COUNT(*) FROM inventory_alerts").fetchone()[0]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _run_scheduler(db_path, interval):
+    conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+    while True:
+        try:
+            run_checks(conn)
+        except sqlite3.Error as e:
+            print(f"Inventory alert check failed: {e}")
+        time.sleep(interval)
+
+
+def start_scheduler(db_path, interval=ALERT_INTERVAL_SECONDS):
+    """Start the background alert checker once per process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = threading.Thread(target=_run_scheduler, args=(db_path, interval),
+                                          name="inventory-alerts", daemon=True)
+            _scheduler.start()
+    return _scheduler
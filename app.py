@@ -1,52 +1,22 @@
 import streamlit as st
 import sqlite3
+import json
 import pandas as pd
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 
 import os
 import pdfkit  # Add this import at the top
 import subprocess  # Add this import at the top
 
-config = pdfkit.configuration(wkhtmltopdf="C:/Program Files/wkhtmltopdf/bin/wkhtmltopdf.exe")
-# Initialize SQLite database
-conn = sqlite3.connect('pharmacy_inventory.db', check_same_thread=False)
-c = conn.cursor()
-
-# Create table if not exists
-c.execute('''CREATE TABLE IF NOT EXISTS inventory
-             (id INTEGER PRIMARY KEY AUTOINCREMENT,
-              medicine_name TEXT,
-              quantity INTEGER,
-              manufacturer TEXT,
-              supplier TEXT,
-              supplier_price REAL,
-              batch_no TEXT,
-              exp_mfg_date DATE,
-              amount REAL,
-              paid BOOLEAN)''')
-conn.commit()
-
-# Create table for invoices if not exists
-c.execute('''CREATE TABLE IF NOT EXISTS invoices
-             (id INTEGER PRIMARY KEY AUTOINCREMENT,
-              invoice_no TEXT,
-              customer_name TEXT,
-              customer_phone TEXT,
-              total_amount REAL,
-              date DATE,
-              paid BOOLEAN)''')
-conn.commit()
-
-# Create table for invoice items if not exists
-c.execute('''CREATE TABLE IF NOT EXISTS invoice_items
-             (id INTEGER PRIMARY KEY AUTOINCREMENT,
-              invoice_id INTEGER,
-              medicine_name TEXT,
-              quantity INTEGER,
-              rate REAL,
-              total REAL,
-              FOREIGN KEY (invoice_id) REFERENCES invoices (id))''')
-conn.commit()
+import alerts
+import migrations
+import reports
+import resources
+import search
+
+# The database connection, schema registry and PDF configuration are shared
+# process-wide resources created on first use (see resources.py), nothing is
+# opened or migrated at import time.
 
 def ensure_history_folder():
     if not os.path.exists('history'):
@@ -64,7 +34,7 @@ def save_invoice_pdf(invoice_no, html_content):
         print(f"Attempting to save PDF at: {file_path}")  # Debug print
         
         # Convert HTML to PDF
-        pdfkit.from_string(html_content, file_path, configuration=config)
+        pdfkit.from_string(html_content, file_path, configuration=resources.get_pdf_config())
         print(f"PDF saved successfully at: {file_path}")  # Debug print
         
         # Verify file exists
@@ -86,9 +56,10 @@ def inventory_management():
     with st.sidebar:
         st.header("Add New Column")
         new_column = st.text_input("New Column Name")
-        column_type = st.selectbox("Column Type", ["TEXT", "INTEGER", "REAL", "DATE", "BOOLEAN"])
+        column_type = st.selectbox("Column Type", migrations.COLUMN_TYPES)
+        indexed = st.checkbox("Index this column")
         if st.button("Add Column"):
-            add_new_column(new_column, column_type)
+            add_new_column(new_column, column_type, indexed)
         
         st.markdown("---")
         
@@ -121,17 +92,17 @@ def invoice_generator():
         customer_phone = st.text_input("Customer Phone")
 
         st.subheader("Add Items")
-        medicine_name = st.selectbox("Select Medicine", get_medicine_names())
+        search_text = st.text_input("Search Medicine", placeholder="Name, manufacturer or batch no.")
+        medicine_details = st.selectbox("Select Medicine", search.search_medicines(resources.get_pharmacy_db(), search_text),
+                                        format_func=format_medicine_option)
         quantity = st.number_input("Quantity", min_value=1, value=1)
         
-        if medicine_name:
-            medicine_details = get_medicine_details(medicine_name)
-            if medicine_details:
-                st.write(f"Available Quantity: {medicine_details['quantity']}")
-                st.write(f"Rate: ₹{medicine_details['amount']:.2f}")
-                
-                if st.button("Add to Invoice"):
-                    add_item_to_invoice(medicine_name, quantity, medicine_details['amount'])
+        if medicine_details:
+            st.write(f"Available Quantity: {medicine_details['quantity']}")
+            st.write(f"Rate: ₹{medicine_details['amount']:.2f}")
+            
+            if st.button("Add to Invoice"):
+                add_item_to_invoice(medicine_details, quantity)
 
         st.subheader("Invoice Items")
         display_invoice_items()
@@ -143,34 +114,33 @@ def invoice_generator():
         st.subheader("Invoice Preview")
         display_invoice_preview(invoice_no, customer_name, customer_phone)
 
-def get_medicine_names():
-    c.execute("SELECT DISTINCT medicine_name FROM inventory")
-    return [row[0] for row in c.fetchall()]
-
-def get_medicine_details(medicine_name):
-    c.execute("SELECT quantity, amount, manufacturer, batch_no, exp_mfg_date FROM inventory WHERE medicine_name = ?", (medicine_name,))
-    result = c.fetchone()
-    if result:
-        return {"quantity": result[0], "amount": result[1], "manufacturer": result[2], "batch_no": result[3], "exp_mfg_date": result[4]}
-    return None
+def format_medicine_option(medicine):
+    return (f"{medicine['medicine_name']} ({medicine['batch_no']}) - "
+            f"Stock: {medicine['quantity']}, ₹{medicine['amount']:.2f}")
 
-def add_item_to_invoice(medicine_name, quantity, rate):
+def add_item_to_invoice(medicine, quantity):
     if 'invoice_items' not in st.session_state:
         st.session_state.invoice_items = []
     
+    # Keep the chosen batch, other rows may share the medicine name
+    rate = medicine['amount']
     total = quantity * rate
     st.session_state.invoice_items.append({
-        "medicine_name": medicine_name,
+        "inventory_id": medicine['id'],
+        "medicine_name": medicine['medicine_name'],
+        "manufacturer": medicine['manufacturer'],
+        "batch_no": medicine['batch_no'],
+        "exp_mfg_date": medicine['exp_mfg_date'],
         "quantity": quantity,
         "rate": rate,
         "total": total
     })
-    st.success(f"Added {medicine_name} to the invoice.")
+    st.success(f"Added {medicine['medicine_name']} ({medicine['batch_no']}) to the invoice.")
 
 def display_invoice_items():
     if 'invoice_items' in st.session_state and st.session_state.invoice_items:
         df = pd.DataFrame(st.session_state.invoice_items)
-        st.dataframe(df)
+        st.dataframe(df[["medicine_name", "batch_no", "exp_mfg_date", "quantity", "rate", "total"]])
         
         total_amount = df['total'].sum()
         st.write(f"Total Amount: ₹{total_amount:.2f}")
@@ -184,19 +154,21 @@ def generate_invoice(invoice_no, customer_name, customer_phone):
 
     total_amount = sum(item['total'] for item in st.session_state.invoice_items)
     
-    # Save invoice to database
-    c.execute('''INSERT INTO invoices (invoice_no, customer_name, customer_phone, total_amount, date, paid)
-                 VALUES (?, ?, ?, ?, ?, ?)''',
-              (invoice_no, customer_name, customer_phone, total_amount, date.today(), False))
-    invoice_id = c.lastrowid
-
-    # Save invoice items to database
-    for item in st.session_state.invoice_items:
-        c.execute('''INSERT INTO invoice_items (invoice_id, medicine_name, quantity, rate, total)
-                     VALUES (?, ?, ?, ?, ?)''',
-                  (invoice_id, item['medicine_name'], item['quantity'], item['rate'], item['total']))
-
-    conn.commit()
+    conn = resources.get_pharmacy_db()
+    # The connection is shared by every session, a failed write must be rolled
+    # back here so the next session's commit doesn't pick up half of it
+    with resources.get_pharmacy_write_lock(), conn:
+        # Save invoice to database
+        cursor = conn.execute('''INSERT INTO invoices (invoice_no, customer_name, customer_phone, total_amount, date, paid)
+                                 VALUES (?, ?, ?, ?, ?, ?)''',
+                              (invoice_no, customer_name, customer_phone, total_amount, date.today(), False))
+        invoice_id = cursor.lastrowid
+
+        # Save invoice items to database
+        conn.executemany('''INSERT INTO invoice_items (invoice_id, medicine_name, quantity, rate, total)
+                            VALUES (?, ?, ?, ?, ?)''',
+                         [(invoice_id, item['medicine_name'], item['quantity'], item['rate'], item['total'])
+                          for item in st.session_state.invoice_items])
 
     st.success("Invoice generated successfully!")
     st.session_state.invoice_items = []  # Clear the invoice items
@@ -205,13 +177,12 @@ def display_invoice_preview(invoice_no, customer_name, customer_phone):
     if 'invoice_items' in st.session_state and st.session_state.invoice_items:
         items = []
         for item in st.session_state.invoice_items:
-            medicine_details = get_medicine_details(item['medicine_name'])
             items.append({
                 'medicine_name': item['medicine_name'],
                 'quantity': item['quantity'],
-                'manufacturer': medicine_details.get('manufacturer', ''),
-                'batch_no': medicine_details.get('batch_no', ''),
-                'exp_mfg_date': medicine_details.get('exp_mfg_date', ''),
+                'manufacturer': item['manufacturer'] or '',
+                'batch_no': item['batch_no'] or '',
+                'exp_mfg_date': item['exp_mfg_date'] or '',
                 'rate': item['rate'],
                 'total': item['total']
             })
@@ -343,7 +314,7 @@ def generate_invoice_html(invoice_no, customer_name, customer_phone, items):
     return html
 
 def display_inventory():
-    df = pd.read_sql_query("SELECT * FROM inventory", conn)
+    df = pd.read_sql_query(resources.get_inventory_schema().select_sql, resources.get_pharmacy_db())
     
     # Custom CSS to force full width
     st.markdown("""
@@ -365,7 +336,7 @@ def display_inventory():
     
     st.data_editor(
         df,
-        use_container_width=True,
+        width="stretch",
         num_rows="dynamic",
         height=height
     )
@@ -388,80 +359,164 @@ def add_edit_inventory():
         amount = st.number_input("Amount", min_value=0.0)
         paid = st.checkbox("Paid")
 
+    attributes = attribute_inputs(key_prefix="add_")
+
     if st.button("Add/Update Item"):
-        add_update_item(medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid)
+        add_update_item(medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid, attributes)
+
+def attribute_inputs(values=None, key_prefix=""):
+    # One input per user-added column, typed by its registered column type
+    values = values or {}
+    result = {}
+    for name, column_type, _ in resources.get_inventory_schema().attributes:
+        value = values.get(name)
+        key = f"{key_prefix}attr_{name}"
+        if column_type == "INTEGER":
+            result[name] = st.number_input(name, value=int(value or 0), step=1, key=key)
+        elif column_type == "REAL":
+            result[name] = st.number_input(name, value=float(value or 0.0), key=key)
+        elif column_type == "DATE":
+            result[name] = st.date_input(name, value=date.fromisoformat(value) if value else None, key=key)
+        elif column_type == "BOOLEAN":
+            result[name] = st.checkbox(name, value=bool(value), key=key)
+        else:
+            result[name] = st.text_input(name, value=value or "", key=key)
+    return result
 
-def add_new_column(column_name, column_type):
+def add_new_column(column_name, column_type, indexed=False):
     try:
-        c.execute(f"ALTER TABLE inventory ADD COLUMN {column_name} {column_type}")
-        conn.commit()
+        with resources.get_pharmacy_write_lock():
+            resources.get_inventory_schema().add_attribute(column_name, column_type, indexed)
         st.success(f"Added new column: {column_name}")
-    except sqlite3.OperationalError:
-        st.error("Column already exists or invalid column name/type")
-
-def add_update_item(medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid):
-    c.execute('''INSERT OR REPLACE INTO inventory 
-                 (medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid) 
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-              (medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid))
-    conn.commit()
+    except ValueError as e:
+        st.error(str(e))
+    except sqlite3.Error as e:
+        st.error(f"Could not add column: {e}")
+
+def add_update_item(medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid, attributes=None):
+    conn = resources.get_pharmacy_db()
+    with resources.get_pharmacy_write_lock(), conn:
+        conn.execute('''INSERT OR REPLACE INTO inventory 
+                        (medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid, attributes) 
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                     (medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid,
+                      resources.get_inventory_schema().dump_attributes(attributes or {})))
     st.success("Item added/updated successfully")
 
 def edit_existing_product():
+    conn = resources.get_pharmacy_db()
+
     # Fetch all product names
-    c.execute("SELECT DISTINCT medicine_name FROM inventory")
-    products = [row[0] for row in c.fetchall()]
+    products = [row[0] for row in conn.execute("SELECT DISTINCT medicine_name FROM inventory")]
     
     selected_product = st.selectbox("Select Product to Edit", products)
     
     if selected_product:
-        # Fetch the selected product's details
-        c.execute("SELECT * FROM inventory WHERE medicine_name = ?", (selected_product,))
-        product_details = c.fetchone()
+        # Fetch the selected product's details, by column name so added columns never shift fields
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute("SELECT * FROM inventory WHERE medicine_name = ?", (selected_product,))
+        product_details = cursor.fetchone()
         
         if product_details:
             st.write(f"Editing: {selected_product}")
             
             # Create input fields with current values
-            medicine_name = st.text_input("Medicine Name", value=product_details[1])
-            quantity = st.number_input("Quantity Available", value=product_details[2], min_value=0)
-            manufacturer = st.text_input("Manufacturer", value=product_details[3])
-            supplier = st.text_input("Supplier", value=product_details[4])
-            supplier_price = st.number_input("Supplier Price", value=product_details[5], min_value=0.0)
-            batch_no = st.text_input("Batch No.", value=product_details[6])
-            exp_mfg_date = st.date_input("Exp/Mfg Date", value=datetime.strptime(product_details[7], '%Y-%m-%d').date())
-            amount = st.number_input("Amount", value=product_details[8], min_value=0.0)
-            paid = st.checkbox("Paid", value=product_details[9])
+            medicine_name = st.text_input("Medicine Name", value=product_details["medicine_name"])
+            quantity = st.number_input("Quantity Available", value=product_details["quantity"], min_value=0)
+            manufacturer = st.text_input("Manufacturer", value=product_details["manufacturer"])
+            supplier = st.text_input("Supplier", value=product_details["supplier"])
+            supplier_price = st.number_input("Supplier Price", value=product_details["supplier_price"], min_value=0.0)
+            batch_no = st.text_input("Batch No.", value=product_details["batch_no"])
+            exp_mfg_date = st.date_input("Exp/Mfg Date", value=datetime.strptime(product_details["exp_mfg_date"], '%Y-%m-%d').date())
+            amount = st.number_input("Amount", value=product_details["amount"], min_value=0.0)
+            paid = st.checkbox("Paid", value=product_details["paid"])
+            attributes = attribute_inputs(json.loads(product_details["attributes"] or "{}"), key_prefix="edit_")
             
             if st.button("Update Product"):
-                update_product(product_details[0], medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid)
+                update_product(product_details["id"], medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid, attributes)
                 st.success("Product updated successfully!")
                 st.session_state.show_edit_popup = False
-                st.experimental_rerun()
+                st.rerun()
         else:
             st.error("Product not found in the database.")
     
     if st.button("Close"):
         st.session_state.show_edit_popup = False
-        st.experimental_rerun()
+        st.rerun()
+
+def update_product(id, medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid, attributes=None):
+    conn = resources.get_pharmacy_db()
+    with resources.get_pharmacy_write_lock(), conn:
+        conn.execute('''UPDATE inventory 
+                        SET medicine_name=?, quantity=?, manufacturer=?, supplier=?, supplier_price=?, 
+                            batch_no=?, exp_mfg_date=?, amount=?, paid=?, attributes=?
+                        WHERE id=?''',
+                     (medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid,
+                      resources.get_inventory_schema().dump_attributes(attributes or {}), id))
+
+def sales_dashboard():
+    st.title("Sales & Inventory Dashboard")
+    conn = resources.get_pharmacy_db()
+
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("From", date.today() - timedelta(days=30))
+    with col2:
+        end_date = st.date_input("To", date.today())
 
-def update_product(id, medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid):
-    c.execute('''UPDATE inventory 
-                 SET medicine_name=?, quantity=?, manufacturer=?, supplier=?, supplier_price=?, 
-                     batch_no=?, exp_mfg_date=?, amount=?, paid=?
-                 WHERE id=?''',
-              (medicine_name, quantity, manufacturer, supplier, supplier_price, batch_no, exp_mfg_date, amount, paid, id))
-    conn.commit()
+    st.header("Daily Sales")
+    sales_df = pd.DataFrame(reports.daily_sales(conn, start_date, end_date),
+                            columns=["Date", "Quantity", "Revenue"])
+    if sales_df.empty:
+        st.write("No sales in the selected period.")
+    else:
+        st.metric("Total Revenue", f"₹{sales_df['Revenue'].sum():.2f}")
+        st.bar_chart(sales_df, x="Date", y="Revenue")
+
+    st.header("Top Medicines")
+    top_df = pd.DataFrame(reports.top_medicines(conn, start_date, end_date),
+                          columns=["Medicine", "Quantity", "Revenue"])
+    st.dataframe(top_df, width="stretch")
+
+    st.header("Stock Value by Supplier")
+    stock_df = pd.DataFrame(reports.stock_value_by_supplier(conn),
+                            columns=["Supplier", "Quantity", "Cost Value", "Retail Value"])
+    st.dataframe(stock_df, width="stretch")
+
+    st.header("Expiring Soon")
+    days = st.number_input("Expiring within (days)", min_value=1, value=alerts.EXPIRY_WINDOW_DAYS)
+    expiry_df = pd.DataFrame(reports.expiring_batches(conn, days),
+                             columns=["Medicine", "Batch No.", "Supplier", "Expiry", "Quantity"])
+    st.dataframe(expiry_df, width="stretch")
+
+def display_alerts():
+    # Reads the precomputed alerts table, the scheduler keeps it up to date
+    conn = resources.get_pharmacy_db()
+    inventory_alerts = alerts.get_alerts(conn)
+    labels = {"expired": "Expired", "expiring": "Expiring", "low_stock": "Low stock"}
+    with st.sidebar.expander(f"Alerts ({alerts.count_alerts(conn)})", expanded=bool(inventory_alerts)):
+        if not inventory_alerts:
+            st.write("No alerts.")
+        for kind, medicine_name, batch_no, exp_date, quantity in inventory_alerts:
+            message = f"{labels[kind]}: {medicine_name} ({batch_no}) - Qty {quantity}, Exp {exp_date}"
+            if kind == "low_stock":
+                st.warning(message)
+            else:
+                st.error(message)
 
 def main():
     st.set_page_config(layout="wide")  # Set the page to wide mode
     st.sidebar.title("Navigation")
-    page = st.sidebar.radio("Go to", ["Inventory Management", "Invoice Generator"])
+    page = st.sidebar.radio("Go to", ["Inventory Management", "Invoice Generator", "Dashboard"])
+    display_alerts()
 
     if page == "Inventory Management":
         inventory_management()
     elif page == "Invoice Generator":
         invoice_generator()
+    elif page == "Dashboard":
+        sales_dashboard()
 
 if __name__ == "__main__":
     if 'show_edit_popup' not in st.session_state:
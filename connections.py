@@ -0,0 +1,78 @@
+import queue
+import re
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+class ConnectionPool:
+    """
+    Pool of SQLite connections with a set of databases attached under aliases.
+
+    Every connection is an in-memory main database with each entry of
+    databases ({alias: path}) attached, so one query can read and join tables
+    across all of them as alias.table (unqualified names still resolve when
+    they are unique). Aliases in read_only_aliases are attached read-only.
+    """
+
+    def __init__(self, databases, size=4, read_only=False, uri=False, timeout=30, read_only_aliases=()):
+        for alias in databases:
+            if not IDENTIFIER.match(alias):
+                raise ValueError(f"Invalid database alias: {alias}")
+        self.databases = dict(databases)
+        self.read_only = read_only
+        self.read_only_aliases = set(read_only_aliases)
+        self.uri = uri
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self.closed = False
+
+    def _connect(self):
+        # ATTACH only honours the URI of a read-only database on a URI connection
+        conn = sqlite3.connect(":memory:", check_same_thread=False, timeout=self.timeout,
+                               uri=self.uri or bool(self.read_only_aliases))
+        for alias, path in self.databases.items():
+            if alias in self.read_only_aliases and not self.uri:
+                path = Path(path).resolve().as_uri() + "?mode=ro"
+            conn.execute(f'ATTACH DATABASE ? AS "{alias}"', (path,))
+        if self.read_only:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self.closed:
+            conn.close()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        if self.closed:
+            # close() ran while we were returning the connection
+            self.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close idle connections, ones still in use are closed when returned."""
+        self.closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
@@ -0,0 +1,325 @@
+import os
+import threading
+
+import google.generativeai as genai
+
+from connections import ConnectionPool
+from replica import REFRESH_INTERVAL_SECONDS, SnapshotReplica
+from query_templates import QUERY_LOG_DB, QueryTemplates
+from result_cache import FORMATS, ResultCache
+from instance.she import get_database_snapshot
+
+DEFAULT_DATABASES = {"hospital": "instance/hospital.db"}
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+MODEL_NAME = "gemini-1.5-flash"
+# Rows of a SELECT result shown to the format model
+PREVIEW_ROWS = 11
+# Results of the most frequent question templates are recomputed in the
+# background whenever the data changes, so those questions are answered from cache
+HOT_TEMPLATES = 10
+HOT_REFRESH_INTERVAL_SECONDS = 30
+
+def remove_sql_markers(text):
+    if text.startswith("```sql"):
+        text = text.replace("```sql", "")
+        text = text.replace("\n```", "")
+        return text.strip()
+    else:
+        return text
+
+class HospitalDatabaseQA:
+    """
+    Model clients and schema catalog for the chat page.
+
+    One instance is shared by every session in the process, so it holds no
+    conversation state: each session keeps its own chats from start_conversation()
+    and passes them to ask().
+
+    databases maps an alias to a database path. All of them are attached on
+    pooled connections, so generated SQL can join across databases using
+    alias.table names. Aliases in read_only_databases are attached read-only,
+    so generated writes can only change the other databases.
+
+    With snapshot_mode, SELECTs run against a read-only in-memory replica
+    refreshed every refresh_interval seconds, so long analytical queries never
+    hold locks on the live files. Writes still go to the live databases.
+
+    Answered SELECTs are logged to learn frequent question templates (see
+    query_templates.py). A question matching a learned template skips the SQL
+    model, and the hot templates' results are kept precomputed in the result cache.
+    """
+
+    def __init__(self, databases=None, pool_size=4, snapshot_mode=False,
+                 refresh_interval=REFRESH_INTERVAL_SECONDS, query_log=QUERY_LOG_DB, read_only_databases=()):
+        if not GEMINI_API_KEY:
+            raise RuntimeError("GEMINI_API_KEY is not set, export your Gemini API key before starting the chat")
+        self.databases = dict(databases or DEFAULT_DATABASES)
+        self.read_only_databases = set(read_only_databases)
+        self.pool = ConnectionPool(self.databases, size=pool_size, read_only_aliases=self.read_only_databases)
+        self.replica = None
+        if snapshot_mode:
+            self.replica = SnapshotReplica(self.databases, refresh_interval, pool_size)
+        self.results = ResultCache()
+        self.templates = QueryTemplates(query_log)
+        self._data_changed = threading.Event()
+        self._stop = threading.Event()
+        self._hot_refresh = threading.Thread(target=self._run_hot_refresh, name="chat-hot-refresh", daemon=True)
+        self._hot_refresh.start()
+        genai.configure(api_key=GEMINI_API_KEY)
+
+        # Get schema during initialization
+        schema = self._get_database_schema()
+
+        self.sql_model = genai.GenerativeModel(
+            model_name=MODEL_NAME,
+            generation_config={
+                "temperature": 0.1,
+                "top_p": 0.95,
+                "top_k": 40,
+                "max_output_tokens": 8192,
+            },
+            system_instruction=f"""Given the following SQLite database schema:
+{schema}
+
+The databases are attached to one SQLite connection. Always qualify table names with
+their database alias (e.g. {next(iter(self.databases))}.table_name), a single query may join tables
+from different databases.
+
+You are a SQL query generator. When given a question, generate ONLY the SQL query needed to answer it, without any explanations.
+If no answer can be found, return "SELECT 0 WHERE 0;".
+Keep responses focused and precise, returning only valid SQL queries."""
+        )
+
+        # Create two separate models with their own configurations
+        self.format_model = genai.GenerativeModel(
+            model_name=MODEL_NAME,
+            generation_config={
+                "temperature": 0.7,
+                "top_p": 0.95,
+                "top_k": 40,
+                "max_output_tokens": 8192,
+            }
+        )
+
+    def start_conversation(self, sql_history=None, format_history=None):
+        """Return a (sql_chat, format_chat) pair, optionally seeded with earlier turns."""
+        chat_history = []
+        for entry in sql_history or []:
+            chat_history.extend([
+                {"role": "user", "parts": [entry["prompt"]]},
+                {"role": "model", "parts": [entry["query"]]}
+            ])
+
+        format_chat_history = []
+        for entry in format_history or []:
+            format_chat_history.extend([
+                {"role": "user", "parts": [entry["prompt"]]},
+                {"role": "model", "parts": [entry["result"]]}
+            ])
+
+        return (self.sql_model.start_chat(history=chat_history),
+                self.format_model.start_chat(history=format_chat_history))
+
+    def get_connection(self, read_only=False):
+        """
+        Context manager yielding a pooled connection with every database attached,
+        from the snapshot replica for read_only queries when snapshot mode is on.
+        """
+        if read_only and self.replica is not None:
+            return self.replica.connection()
+        return self.pool.connection()
+
+    def data_version(self):
+        """Identifies the data SELECTs currently see, used to key cached results."""
+        if self.replica is not None:
+            return f"snapshot-{self.replica.generation}"
+        stats = [os.stat(path) for path in self.databases.values()]
+        return ",".join(f"{stat.st_mtime_ns}:{stat.st_size}" for stat in stats)
+
+    def export_result(self, sql_query, fmt="csv"):
+        """
+        Return the path of a file holding the full result of sql_query, reusing
+        a cached export while the data is unchanged.
+        """
+        if not sql_query.strip().upper().startswith('SELECT'):
+            raise ValueError("Only SELECT results can be exported")
+        version = self.data_version()
+        path = self.results.get(sql_query, version, fmt)
+        if path is None:
+            with self.get_connection(read_only=True) as conn:
+                cursor = conn.execute(sql_query)
+                try:
+                    path = self.results.write(sql_query, version, fmt, cursor)
+                finally:
+                    # A failed export leaves the statement unfinished, which would keep its read lock
+                    cursor.close()
+        return path
+
+    def refresh_hot_results(self):
+        """Precompute the results of the most used question templates."""
+        for sql_query in self.templates.hot_queries(HOT_TEMPLATES):
+            try:
+                self.export_result(sql_query, FORMATS[-1])
+            except Exception as e:
+                print(f"Could not precompute {sql_query}: {e}")
+
+    def _run_hot_refresh(self):
+        last_version = None
+        while not self._stop.is_set():
+            # Woken early after a write from the chat, otherwise polls for outside writes
+            self._data_changed.wait(HOT_REFRESH_INTERVAL_SECONDS)
+            self._data_changed.clear()
+            if self._stop.is_set():
+                break
+            try:
+                version = self.data_version()
+                if version != last_version:
+                    self.refresh_hot_results()
+                    last_version = version
+            except OSError as e:
+                print(f"Hot result refresh failed: {e}")
+
+    def close(self):
+        """Stop the background threads and close every connection, including the replica's."""
+        self._stop.set()
+        self._data_changed.set()
+        self._hot_refresh.join()
+        if self.replica is not None:
+            self.replica.close()
+        self.pool.close()
+
+    def _cached_preview(self, sql_query):
+        version = self.data_version()
+        for fmt in ("parquet", "csv"):
+            path = self.results.get(sql_query, version, fmt)
+            if path is not None:
+                return self.results.preview(path, PREVIEW_ROWS + 1)
+        return None
+
+    def _get_database_schema(self):
+        # Read from the precomputed schema snapshots instead of introspecting live,
+        # namespaced by alias so the model sees one merged catalog
+        schema = []
+        for alias, db_path in self.databases.items():
+            tables = get_database_snapshot(db_path)['tables']
+            # Skip SQLite internals and the shadow tables behind virtual tables
+            shadow_prefixes = tuple(f"{name}_" for name, table in tables.items() if table['virtual'])
+            access = " (read-only)" if alias in self.read_only_databases else ""
+            schema.append(f"Database {alias}{access}:")
+            for table_name, table in tables.items():
+                if table_name.startswith("sqlite_") or table_name.startswith(shadow_prefixes):
+                    continue
+                schema.append(f"Table {alias}.{table_name}:")
+                for col in table['columns']:
+                    schema.append(f"  - {col['name']} ({col['type']})")
+
+        return "\n".join(schema)
+
+    def ask(self, question, conversation):
+        """
+        Answer question using the session's (sql_chat, format_chat) conversation.
+
+        Returns a dict with the prompts, generated SQL, query result message and
+        final answer, so the caller can record them in its own history.
+        """
+        sql_chat, format_chat = conversation
+        result = {"question": question, "sql_prompt": None, "sql_query": None,
+                  "is_select": False, "from_template": False, "data_message": None, "format_prompt": None}
+        try:
+            print("\n========== PROCESSING NEW QUERY ==========")
+            print(f"User Input: {question}")
+
+            # 1. Generate SQL query from user question using chat history
+            sql_prompt = f"""question: {question}"""
+            result["sql_prompt"] = sql_prompt
+
+            print("\n---------- SQL Prompt ----------")
+            print(sql_prompt)
+
+            # Frequent questions are answered from a learned template without the SQL model
+            sql_query = self.templates.match(question)
+            if sql_query is not None:
+                print("Matched a learned question template")
+                result["from_template"] = True
+            else:
+                # Use chat with history instead of single generate_content
+                sql_response = sql_chat.send_message(sql_prompt)
+                sql_query = remove_sql_markers(sql_response.text.strip())
+            result["sql_query"] = sql_query
+
+            print("\n---------- Generated SQL Query ----------")
+            print(sql_query)
+
+            # 2. Execute query and get results
+            print("\n---------- Executing Query ----------")
+            try:
+                is_select = sql_query.strip().upper().startswith('SELECT')
+                result["is_select"] = is_select
+                if is_select:
+                    cached = self._cached_preview(sql_query)
+                    if cached is not None:
+                        print("Using cached result")
+                        column_names, results = cached
+                    else:
+                        # Only the preview rows are fetched, the full result is
+                        # streamed to a file when the user exports it
+                        with self.get_connection(read_only=True) as conn:
+                            cursor = conn.execute(sql_query)
+                            results = cursor.fetchmany(PREVIEW_ROWS + 1)
+                            column_names = [description[0] for description in cursor.description]
+                            # An unfinished statement keeps its read lock, end it before the connection goes back to the pool
+                            cursor.close()
+                    formatted_results = []
+                    for row in results[:PREVIEW_ROWS]:
+                        formatted_row = dict(zip(column_names, row))
+                        formatted_results.append(formatted_row)
+                    print(f"formatted_results: {formatted_results}")
+                    data_message = f"Query returned: {formatted_results}"
+                    if len(results) > PREVIEW_ROWS:
+                        data_message += f" (first {PREVIEW_ROWS} rows shown, more available)"
+                    self.templates.record(question, sql_query, from_template=result["from_template"])
+                else:
+                    with self.get_connection() as conn:
+                        cursor = conn.cursor()
+                        cursor.execute(sql_query)
+                        conn.commit()
+                        affected_rows = cursor.rowcount
+                        data_message = f"Operation successful. Affected rows: {affected_rows}"
+                    self._data_changed.set()
+            except Exception as e:
+                data_message = f"Error executing query: {str(e)}"
+                print(f"\n---------- SQL Error ----------")
+                print(data_message)
+            result["data_message"] = data_message
+
+            print("\n---------- Query Results ----------")
+            print(data_message)
+
+            # 3. Format final response
+            format_prompt = f"""
+            Question: {question}
+            SQL Query: {sql_query}
+            Result: {data_message}
+
+            Please provide a natural, helpful response about results of what was done.
+            """
+            result["format_prompt"] = format_prompt
+
+            print("\n---------- Format Prompt ----------")
+            print(format_prompt)
+
+            # Use format chat instead of generate_content
+            final_response = format_chat.send_message(format_prompt)
+
+            print("\n---------- Final Response ----------")
+            print(final_response.text.strip())
+            print("\n====================================")
+
+            result["answer"] = final_response.text.strip()
+
+        except Exception as e:
+            print(f"\n---------- ERROR ----------")
+            print(f"Error occurred: {str(e)}")
+            print("\n====================================")
+            result["answer"] = f"Error: {e}"
+        return result
@@ -1,88 +1,394 @@
+import argparse
+import json
+import os
 import sqlite3
 import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
+DEFAULT_SNAPSHOT = os.environ.get('SCHEMA_SNAPSHOT_PATH',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema_snapshot.json'))
+
+# Each pragma is joined against sqlite_master so a whole database is
+# introspected with a handful of queries instead of several per table.
+COLUMNS_QUERY = '''
+SELECT m.name, p.name, p.type, p."notnull", p.dflt_value, p.pk, p.hidden
+FROM sqlite_master m JOIN pragma_table_xinfo(m.name) p
+WHERE m.type = 'table' AND p.hidden != 1
+ORDER BY m.name, p.cid
+'''
+
+INDEXES_QUERY = '''
+SELECT m.name, il.name, il."unique", il.origin, group_concat(ii.name, ','), s.sql
+FROM sqlite_master m
+JOIN pragma_index_list(m.name) il
+JOIN pragma_index_info(il.name) ii
+LEFT JOIN sqlite_master s ON s.type = 'index' AND s.name = il.name
+WHERE m.type = 'table'
+GROUP BY m.name, il.name
+ORDER BY m.name, il.name
+'''
+
+FOREIGN_KEYS_QUERY = '''
+SELECT m.name, fk.id, fk."table", fk."from", fk."to", fk.on_update, fk.on_delete
+FROM sqlite_master m JOIN pragma_foreign_key_list(m.name) fk
+WHERE m.type = 'table'
+ORDER BY m.name, fk.id, fk.seq
+'''
+
+
+def _snapshot_key(db_path):
+    return os.path.normpath(os.path.relpath(db_path))
+
+
+def _row_estimates(cursor, tables):
+    """
+    Estimate row counts without scanning: ANALYZE statistics when present,
+    otherwise max(rowid), which SQLite answers from the end of the b-tree.
+    """
+    estimates = {}
+    try:
+        cursor.execute("SELECT tbl, stat FROM sqlite_stat1")
+        for table, stat in cursor.fetchall():
+            if stat:
+                estimates.setdefault(table, int(stat.split()[0]))
+    except sqlite3.OperationalError:
+        pass  # No sqlite_stat1 until ANALYZE has been run
+
+    for table_name, table in tables.items():
+        if table_name in estimates or table['virtual']:
+            continue
+        try:
+            cursor.execute(f'SELECT max(rowid) FROM "{table_name}"')
+            estimates[table_name] = cursor.fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            # WITHOUT ROWID tables have no rowid to look at
+            cursor.execute(f'SELECT COUNT(*) FROM "{table_name}"')
+            estimates[table_name] = cursor.fetchone()[0]
+    return estimates
+
+
+def snapshot_database(db_path):
+    """
+    Introspect one SQLite database.
+
+    Args:
+        db_path (str): Path to the SQLite database file
+
+    Returns:
+        dict: tables with their columns, indexes, foreign keys and row estimates
+    """
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA schema_version")
+        schema_version = cursor.fetchone()[0]
+
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table' ORDER BY name")
+        tables = {}
+        for name, sql in cursor.fetchall():
+            tables[name] = {
+                'sql': sql,
+                'virtual': (sql or '').upper().startswith('CREATE VIRTUAL TABLE'),
+                'columns': [],
+                'indexes': [],
+                'foreign_keys': [],
+                'row_estimate': None,
+            }
+
+        cursor.execute(COLUMNS_QUERY)
+        for table_name, name, type_, notnull, default, pk, hidden in cursor.fetchall():
+            tables[table_name]['columns'].append({
+                'name': name,
+                'type': type_,
+                'not_null': bool(notnull),
+                'default': default,
+                'primary_key': bool(pk),
+                'generated': hidden in (2, 3),
+            })
+
+        cursor.execute(INDEXES_QUERY)
+        for table_name, name, unique, origin, columns, sql in cursor.fetchall():
+            tables[table_name]['indexes'].append({
+                'name': name,
+                'unique': bool(unique),
+                'origin': origin,
+                'columns': columns.split(',') if columns else [],
+                'sql': sql,
+            })
+
+        cursor.execute(FOREIGN_KEYS_QUERY)
+        foreign_keys = {}
+        for table_name, fk_id, ref_table, from_col, to_col, on_update, on_delete in cursor.fetchall():
+            fk = foreign_keys.setdefault((table_name, fk_id), {
+                'table': ref_table, 'from': [], 'to': [], 'on_update': on_update, 'on_delete': on_delete,
+            })
+            fk['from'].append(from_col)
+            fk['to'].append(to_col)
+        for (table_name, _), fk in foreign_keys.items():
+            tables[table_name]['foreign_keys'].append(fk)
+
+        for table_name, estimate in _row_estimates(cursor, tables).items():
+            if table_name in tables:
+                tables[table_name]['row_estimate'] = estimate
+
+        return {
+            'path': _snapshot_key(db_path),
+            'schema_version': schema_version,
+            'tables': tables,
+        }
+    finally:
+        conn.close()
+
+
+def snapshot(db_paths, max_workers=None):
+    """
+    Introspect several databases in parallel.
+
+    Args:
+        db_paths (list): Paths to the SQLite database files
+        max_workers (int): Thread pool size (default: one thread per database)
+
+    Returns:
+        dict: snapshot with one entry per database, keyed by path
+    """
+    db_paths = list(db_paths)
+    with ThreadPoolExecutor(max_workers=max_workers or max(len(db_paths), 1)) as pool:
+        results = list(pool.map(snapshot_database, db_paths))
+    return {
+        'taken_at': datetime.now().isoformat(timespec='seconds'),
+        'databases': {result['path']: result for result in results},
+    }
+
+
+def _by_name(items):
+    return {item['name']: item for item in items}
+
+
+def diff_snapshots(old, new):
+    """
+    Compare two snapshots.
+
+    Returns:
+        dict: per database, the added/removed tables and per table the
+        added/removed/changed columns, indexes and foreign keys
+    """
+    changes = {}
+    old_dbs, new_dbs = old.get('databases', {}), new.get('databases', {})
+    for db in sorted(set(old_dbs) | set(new_dbs)):
+        if db not in new_dbs:
+            changes[db] = {'removed': True}
+            continue
+        if db not in old_dbs:
+            changes[db] = {'added': True}
+            continue
+
+        old_tables, new_tables = old_dbs[db]['tables'], new_dbs[db]['tables']
+        db_changes = {
+            'tables_added': sorted(set(new_tables) - set(old_tables)),
+            'tables_removed': sorted(set(old_tables) - set(new_tables)),
+            'tables_changed': {},
+        }
+        for table in sorted(set(old_tables) & set(new_tables)):
+            table_changes = {}
+            for key in ('columns', 'indexes'):
+                before, after = _by_name(old_tables[table][key]), _by_name(new_tables[table][key])
+                added = sorted(set(after) - set(before))
+                removed = sorted(set(before) - set(after))
+                changed = sorted(name for name in set(before) & set(after) if before[name] != after[name])
+                if added or removed or changed:
+                    table_changes[key] = {'added': added, 'removed': removed, 'changed': changed}
+            if old_tables[table]['foreign_keys'] != new_tables[table]['foreign_keys']:
+                table_changes['foreign_keys'] = {
+                    'before': old_tables[table]['foreign_keys'],
+                    'after': new_tables[table]['foreign_keys'],
+                }
+            if table_changes:
+                db_changes['tables_changed'][table] = table_changes
+
+        if db_changes['tables_added'] or db_changes['tables_removed'] or db_changes['tables_changed']:
+            changes[db] = db_changes
+    return changes
+
+
+def dump(data, output_file=None, fmt='json'):
+    if fmt == 'yaml':
+        try:
+            import yaml
+        except ImportError:
+            print("PyYAML is not installed, use --format json")
+            sys.exit(1)
+        text = yaml.safe_dump(data, sort_keys=False)
+    else:
+        text = json.dumps(data, indent=2)
+
+    if output_file:
+        # Written next to the target and swapped in, readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_file)),
+                                        prefix=os.path.basename(output_file), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            os.replace(tmp_path, output_file)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    else:
+        print(text)
+
+
+def load(path):
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+_loaded_snapshots = {}
+_snapshot_lock = threading.Lock()
+
+
+def _load_cached(snapshot_path):
+    # Re-read the snapshot file only when it has changed on disk
+    mtime = os.path.getmtime(snapshot_path)
+    cached = _loaded_snapshots.get(snapshot_path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, load(snapshot_path))
+        _loaded_snapshots[snapshot_path] = cached
+    return cached[1]
+
+
+def _save_database_snapshot(db, snapshot_path):
+    # Serialized so concurrent sessions don't drop each other's entries
+    with _snapshot_lock:
+        try:
+            data = load(snapshot_path)
+        except (OSError, ValueError):
+            data = {'databases': {}}
+        data['taken_at'] = datetime.now().isoformat(timespec='seconds')
+        # Entries for databases that no longer exist would only grow the file
+        databases = {path: entry for path, entry in data.get('databases', {}).items() if os.path.exists(path)}
+        databases[db['path']] = db
+        data['databases'] = databases
+        dump(data, snapshot_path, 'yaml' if snapshot_path.endswith(('.yaml', '.yml')) else 'json')
+
+
+def get_database_snapshot(db_path, snapshot_path=DEFAULT_SNAPSHOT):
+    """
+    Return the schema of db_path, from the precomputed snapshot when it is
+    still current (same PRAGMA schema_version), otherwise by live introspection.
+    A live result is written back to snapshot_path for the next startup.
+    """
+    try:
+        cached = _load_cached(snapshot_path)['databases'][_snapshot_key(db_path)]
+        conn = sqlite3.connect(db_path)
+        try:
+            current_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        finally:
+            conn.close()
+        if cached['schema_version'] == current_version:
+            return cached
+    except (OSError, KeyError, ValueError, sqlite3.Error):
+        pass
+
+    db = snapshot_database(db_path)
+    try:
+        _save_database_snapshot(db, snapshot_path)
+    except OSError as e:
+        print(f"Could not save schema snapshot: {e}")
+    return db
+
+
 def extract_schema(db_path, output_file='schema.txt'):
     """
     Extract schema from SQLite database and save it to a text file.
-    
+
     Args:
         db_path (str): Path to the SQLite database file
         output_file (str): Path to the output text file (default: schema.txt)
     """
     try:
-        # Connect to the database
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Get list of all tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-        
-        with open(output_file, 'w') as f:
-            f.write(f"Schema for database: {db_path}\n")
-            f.write("=" * 50 + "\n\n")
-            
-            # Iterate through each table
-            for table in tables:
-                table_name = table[0]
-                f.write(f"Table: {table_name}\n")
-                f.write("-" * 30 + "\n")
-                
-                # Get CREATE TABLE statement
-                cursor.execute(f"SELECT sql FROM sqlite_master WHERE type='table' AND name='{table_name}';")
-                create_stmt = cursor.fetchone()[0]
-                f.write(f"{create_stmt};\n\n")
-                
-                # Get table info (column details)
-                cursor.execute(f"PRAGMA table_info({table_name});")
-                columns = cursor.fetchall()
-                
-                f.write("Columns:\n")
-                for col in columns:
-                    col_id, name, type_, notnull, default, pk = col
-                    constraints = []
-                    if pk:
-                        constraints.append("PRIMARY KEY")
-                    if notnull:
-                        constraints.append("NOT NULL")
-                    if default is not None:
-                        constraints.append(f"DEFAULT {default}")
-                    
-                    constraints_str = " | ".join(constraints)
-                    f.write(f"  - {name}: {type_}" + (f" ({constraints_str})" if constraints_str else "") + "\n")
-                
-                # Get index information
-                cursor.execute(f"SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name='{table_name}';")
-                indexes = cursor.fetchall()
-                
-                if indexes:
-                    f.write("\nIndexes:\n")
-                    for idx_name, idx_sql in indexes:
-                        f.write(f"  - {idx_sql};\n")
-                
-                f.write("\n" + "=" * 50 + "\n\n")
-        
-        print(f"Schema has been extracted to {output_file}")
-        
+        db = snapshot_database(db_path)
     except sqlite3.Error as e:
         print(f"SQLite error: {e}")
-    except Exception as e:
-        print(f"Error: {e}")
-    finally:
-        if conn:
-            conn.close()
+        return
+
+    with open(output_file, 'w') as f:
+        f.write(f"Schema for database: {db_path}\n")
+        f.write("=" * 50 + "\n\n")
+
+        for table_name, table in db['tables'].items():
+            f.write(f"Table: {table_name}\n")
+            f.write("-" * 30 + "\n")
+            f.write(f"{table['sql']};\n\n")
+
+            f.write("Columns:\n")
+            for col in table['columns']:
+                constraints = []
+                if col['primary_key']:
+                    constraints.append("PRIMARY KEY")
+                if col['not_null']:
+                    constraints.append("NOT NULL")
+                if col['default'] is not None:
+                    constraints.append(f"DEFAULT {col['default']}")
+
+                constraints_str = " | ".join(constraints)
+                f.write(f"  - {col['name']}: {col['type']}" + (f" ({constraints_str})" if constraints_str else "") + "\n")
+
+            indexes = [idx for idx in table['indexes'] if idx['sql']]
+            if indexes:
+                f.write("\nIndexes:\n")
+                for idx in indexes:
+                    f.write(f"  - {idx['sql']};\n")
+
+            f.write("\n" + "=" * 50 + "\n\n")
+
+    print(f"Schema has been extracted to {output_file}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite schema snapshot tool")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    snap = subparsers.add_parser('snapshot', help="Snapshot one or more databases")
+    snap.add_argument('databases', nargs='+')
+    snap.add_argument('-o', '--output', help="Output file (default: stdout)")
+    snap.add_argument('--format', choices=['json', 'yaml'], default='json')
+    snap.add_argument('--workers', type=int, default=None)
+
+    diff = subparsers.add_parser('diff', help="Diff two snapshot files")
+    diff.add_argument('old')
+    diff.add_argument('new')
+    diff.add_argument('--format', choices=['json', 'yaml'], default='json')
+
+    text = subparsers.add_parser('text', help="Write a human-readable schema for one database")
+    text.add_argument('database')
+    text.add_argument('output', nargs='?', default='schema.txt')
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # The original "she.py <database> [output]" form still means the text command
+    if argv and argv[0] not in subparsers.choices and not argv[0].startswith('-'):
+        argv.insert(0, 'text')
+    args = parser.parse_args(argv)
+
+    if args.command == 'snapshot':
+        for db_path in args.databases:
+            if not Path(db_path).exists():
+                print(f"Error: Database file '{db_path}' not found!")
+                sys.exit(1)
+        dump(snapshot(args.databases, args.workers), args.output, args.format)
+    elif args.command == 'diff':
+        dump(diff_snapshots(load(args.old), load(args.new)), fmt=args.format)
+    else:
+        if not Path(args.database).exists():
+            print(f"Error: Database file '{args.database}' not found!")
+            sys.exit(1)
+        extract_schema(args.database, args.output)
+
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python script.py <database_path> [output_file]")
-        sys.exit(1)
-    
-    db_path = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else 'schema.txt'
-    
-    if not Path(db_path).exists():
-        print(f"Error: Database file '{db_path}' not found!")
-        sys.exit(1)
-    
-    extract_schema(db_path, output_file)
\ No newline at end of file
+    main()
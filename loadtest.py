@@ -0,0 +1,410 @@
+import argparse
+import contextlib
+import gc
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# Headless load test: simulated users drive app.py and the chat page through
+# Streamlit's AppTest runner, all inside this one process, so they share the
+# process-wide resources exactly like sessions of a real server would.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP_SCRIPT = os.path.join(ROOT, "app.py")
+CHAT_SCRIPT = os.path.join(ROOT, "pages", "2_Chat_with_SQL.py")
+SOURCE_DATABASES = {
+    "PHARMACY_DB": os.path.join(ROOT, "pharmacy_inventory.db"),
+    "HOSPITAL_DB": os.path.join(ROOT, "instance", "hospital.db"),
+}
+PERCENTILES = (50, 90, 99)
+LOCK_PROBE_INTERVAL = 0.05
+
+# Chat questions and the SQL the stubbed model answers them with, {n} is
+# filled with a random value so frequent templates get learned as in production
+CHAT_QUESTIONS = [
+    ("How many patients are there?", "SELECT COUNT(*) FROM hospital.patient"),
+    ("Patients older than {n}", "SELECT firstname, lastname, age FROM hospital.patient WHERE age > {n}"),
+    ("Appointments per doctor",
+     "SELECT d.name, COUNT(a.id) FROM hospital.doctor d LEFT JOIN hospital.appointment a ON a.doctor_id = d.id GROUP BY d.id"),
+    ("Medicines with less than {n} in stock",
+     "SELECT medicine_name, batch_no, quantity FROM pharmacy.inventory WHERE quantity < {n}"),
+]
+CHAT_NUMBERS = [20, 30, 40, 50]
+
+_stub_sql = {}
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+class StubChat:
+    def __init__(self, generates_sql, history, latency):
+        self.generates_sql = generates_sql
+        self.history = list(history or [])
+        self.latency = latency
+
+    def send_message(self, prompt):
+        time.sleep(self.latency)
+        self.history.append(prompt)
+        if self.generates_sql:
+            question = prompt.split(":", 1)[1].strip()
+            return StubResponse(_stub_sql.get(question, "SELECT 0 WHERE 0;"))
+        return StubResponse("Here is what I found.")
+
+class StubModel:
+    """Stands in for genai.GenerativeModel, answering after a fixed latency."""
+
+    latency = 0.0
+
+    def __init__(self, model_name=None, generation_config=None, system_instruction=None):
+        # Only the SQL model is given a system instruction
+        self.generates_sql = system_instruction is not None
+
+    def start_chat(self, history=None):
+        return StubChat(self.generates_sql, history, StubModel.latency)
+
+def install_stub_model(latency):
+    import google.generativeai as genai
+
+    StubModel.latency = latency
+    genai.GenerativeModel = StubModel
+    genai.configure = lambda **kwargs: None
+
+class Recorder:
+    """Thread-safe collection of timings (in seconds) and errors by name."""
+
+    def __init__(self):
+        self.timings = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.timings.setdefault(name, []).append(seconds)
+
+    def error(self, name, message):
+        with self._lock:
+            self.errors.setdefault(name, []).append(message)
+
+class TimedLock:
+    """Wraps the pharmacy write lock to record how long writers wait for it."""
+
+    def __init__(self, lock, recorder):
+        self._lock = lock
+        self._recorder = recorder
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self._lock.acquire()
+        self._recorder.record("app write lock", time.perf_counter() - start)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def summarize(values):
+    summary = {"count": len(values), "max_ms": max(values) * 1000}
+    for p in PERCENTILES:
+        summary[f"p{p}_ms"] = percentile(values, p) * 1000
+    return summary
+
+def copy_databases(workdir):
+    """Copy both databases into workdir with the backup API and return {env var: path}."""
+    paths = {}
+    for env_var, source_path in SOURCE_DATABASES.items():
+        path = os.path.join(workdir, os.path.basename(source_path))
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        paths[env_var] = path
+    return paths
+
+def probe_locks(databases, recorder, stop):
+    # Repeatedly takes the SQLite write lock of each database, the time to get
+    # it is how long a writer would have waited at that moment
+    connections = {name: sqlite3.connect(path, timeout=30, isolation_level=None)
+                   for name, path in databases.items()}
+    try:
+        while not stop.is_set():
+            for name, conn in connections.items():
+                start = time.perf_counter()
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    recorder.record(f"sqlite {name}", time.perf_counter() - start)
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error as e:
+                    recorder.error(f"sqlite {name}", str(e))
+            stop.wait(LOCK_PROBE_INTERVAL)
+    finally:
+        for conn in connections.values():
+            conn.close()
+
+class _RuntimeSlot:
+    # Receives the per-run runtime AppTest installs and clears
+    _instance = None
+
+def make_apptest_concurrent():
+    """
+    Patch AppTest so many instances can rerun at once from different threads.
+
+    AppTest is built for one test at a time: each run installs and then clears
+    a global mock runtime, resets the pages directory flag, recompiles the
+    script and toggles the global appTest option. Like a real server, all
+    sessions here share one runtime and one script cache, with the flag and
+    option set once. ast.parse is serialized
+    too, parsing from several threads at once trips a CPython 3.11 bug.
+    """
+    import ast
+    from unittest.mock import MagicMock
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.pages_manager import PagesManager
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    app_test.Runtime = _RuntimeSlot
+
+    # The per-run reset of uses_pages_directory lands on a subclass, not on runs in flight
+    app_test.PagesManager = type("PagesManager", (PagesManager,), {})
+
+    script_cache = ScriptCache()
+    app_test.ScriptCache = lambda: script_cache
+
+    config.set_option("global.appTest", True)
+    app_test.patch_config_options = lambda options: contextlib.nullcontext()
+
+    parse = ast.parse
+    parse_lock = threading.Lock()
+
+    def locked_parse(*args, **kwargs):
+        with parse_lock:
+            return parse(*args, **kwargs)
+
+    ast.parse = locked_parse
+
+def widget(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"No widget labelled {label!r}")
+
+def timed_run(recorder, action, at, step=None):
+    """Run one rerun of at (after step sets up its widgets) and record its latency and errors."""
+    start = time.perf_counter()
+    try:
+        (step() if step else at).run()
+    except Exception as e:
+        recorder.error(action, f"{type(e).__name__}: {e}")
+        return False
+    recorder.record(action, time.perf_counter() - start)
+    for exception in at.exception:
+        recorder.error(action, exception.value)
+    return not at.exception
+
+def edit_inventory(app, recorder, user, iteration):
+    timed_run(recorder, "navigate", app, lambda: app.sidebar.radio[0].set_value("Inventory Management"))
+    widget(app.text_input, "Medicine Name").set_value(f"Loadtest {user}")
+    widget(app.text_input, "Manufacturer").set_value("Loadtest Labs")
+    widget(app.text_input, "Batch No.").set_value(f"LT{user}-{iteration}")
+    widget(app.number_input, "Quantity Available").set_value(random.randint(1, 100))
+    widget(app.number_input, "Amount").set_value(round(random.uniform(1, 50), 2))
+    timed_run(recorder, "inventory edit", app, lambda: widget(app.button, "Add/Update Item").click())
+
+def generate_invoice(app, recorder, run_id, user, iteration):
+    timed_run(recorder, "navigate", app, lambda: app.sidebar.radio[0].set_value("Invoice Generator"))
+    widget(app.text_input, "Invoice No.").set_value(f"LT-{run_id}-{user}-{iteration}")
+    widget(app.text_input, "Customer Name").set_value(f"Customer {user}")
+    if not timed_run(recorder, "invoice search", app,
+                     lambda: widget(app.text_input, "Search Medicine").set_value("Loadtest")):
+        return
+    if not widget(app.selectbox, "Select Medicine").options:
+        recorder.error("invoice search", "No medicine found")
+        return
+    widget(app.number_input, "Quantity").set_value(random.randint(1, 3))
+    timed_run(recorder, "invoice add item", app, lambda: widget(app.button, "Add to Invoice").click())
+    timed_run(recorder, "invoice generate", app, lambda: widget(app.button, "Generate Invoice").click())
+
+def ask_question(chat, recorder):
+    question, sql = random.choice(CHAT_QUESTIONS)
+    n = random.choice(CHAT_NUMBERS)
+    question, sql = question.format(n=n), sql.format(n=n)
+    _stub_sql[question] = sql
+    timed_run(recorder, "chat question", chat, lambda: chat.chat_input[0].set_value(question))
+
+def simulate_user(recorder, run_id, user, iterations, timeout):
+    """One user session on each page, doing iterations of edit, invoice and chat. Returns the sessions."""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_SCRIPT, default_timeout=timeout)
+    chat = AppTest.from_file(CHAT_SCRIPT, default_timeout=timeout)
+    timed_run(recorder, "app load", app)
+    timed_run(recorder, "chat load", chat)
+    for iteration in range(iterations):
+        try:
+            edit_inventory(app, recorder, user, iteration)
+            generate_invoice(app, recorder, run_id, user, iteration)
+            ask_question(chat, recorder)
+        except LookupError as e:
+            recorder.error("widgets", str(e))
+    return app, chat
+
+def run_load(recorder, run_id, users, iterations, timeout):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        futures = [executor.submit(simulate_user, recorder, run_id, user, iterations, timeout)
+                   for user in range(users)]
+        for future in futures:
+            future.result()
+    return time.perf_counter() - start
+
+def measure_session_memory(run_id, sessions, iterations, timeout):
+    """Memory retained per session, measured one session at a time under tracemalloc."""
+    recorder = Recorder()
+    retained = []
+    # Sessions stay referenced so their state counts as retained
+    kept = []
+    tracemalloc.start()
+    try:
+        for session in range(sessions):
+            gc.collect()
+            before = tracemalloc.get_traced_memory()[0]
+            kept.append(simulate_user(recorder, run_id, f"mem{session}", iterations, timeout))
+            gc.collect()
+            retained.append(tracemalloc.get_traced_memory()[0] - before)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"sessions": sessions, "mean_kib": sum(retained) / len(retained) / 1024,
+            "max_kib": max(retained) / 1024, "peak_kib": peak / 1024}
+
+def print_report(report):
+    print(f"\n{report['users']} users x {report['iterations']} iterations "
+          f"in {report['elapsed_s']:.1f}s ({report['reruns_per_s']:.1f} reruns/s)")
+
+    for title, key in (("Rerun latency", "latency"), ("Lock waits", "lock_waits")):
+        print(f"\n{title}:")
+        print(f"  {'':<20}{'count':>7}" + "".join(f"{f'p{p}':>10}" for p in PERCENTILES) + f"{'max':>10}")
+        for name, summary in report[key].items():
+            print(f"  {name:<20}{summary['count']:>7}"
+                  + "".join(f"{summary[f'p{p}_ms']:>8.1f}ms" for p in PERCENTILES)
+                  + f"{summary['max_ms']:>8.1f}ms")
+
+    memory = report.get("memory")
+    if memory:
+        print(f"\nMemory per session ({memory['sessions']} measured): "
+              f"mean {memory['mean_kib']:.0f} KiB, max {memory['max_kib']:.0f} KiB, "
+              f"tracemalloc peak {memory['peak_kib']:.0f} KiB")
+
+    if report["errors"]:
+        print("\nErrors:")
+        for name, messages in report["errors"].items():
+            print(f"  {name}: {len(messages)} (first: {messages[0]})")
+    else:
+        print("\nNo errors.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent users of the pharmacy and chat pages")
+    parser.add_argument('-u', '--users', type=int, default=5)
+    parser.add_argument('-n', '--iterations', type=int, default=3,
+                        help="Inventory edit + invoice + chat question rounds per user")
+    parser.add_argument('--model-latency', type=float, default=0.5,
+                        help="Seconds the stubbed model takes per reply")
+    parser.add_argument('--memory-sessions', type=int, default=3,
+                        help="Sessions to measure memory for after the load phase (0 to skip)")
+    parser.add_argument('--timeout', type=float, default=60, help="Seconds allowed per rerun")
+    parser.add_argument('-o', '--output', help="Also write the report as JSON to this file")
+    parser.add_argument('--keep', action='store_true', help="Keep the working copy of the databases")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show the app's own output")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+    databases = copy_databases(workdir)
+    # Must be set before the app modules are imported, they read it at import time
+    os.environ.update(databases)
+    os.environ["CHAT_RESULT_CACHE_DIR"] = os.path.join(workdir, "chat_results")
+    os.environ["CHAT_QUERY_LOG_DB"] = os.path.join(workdir, "chat_query_log.db")
+    os.environ["SCHEMA_SNAPSHOT_PATH"] = os.path.join(workdir, "schema_snapshot.json")
+    # The stubbed model never uses the key, but the chat refuses to start without one
+    os.environ.setdefault("GEMINI_API_KEY", "loadtest")
+    if not args.verbose:
+        os.environ.setdefault("STREAMLIT_LOGGER_LEVEL", "error")
+    install_stub_model(args.model_latency)
+    make_apptest_concurrent()
+
+    import resources
+
+    recorder = Recorder()
+    write_lock = TimedLock(threading.Lock(), recorder)
+    resources.get_pharmacy_write_lock = lambda: write_lock
+
+    run_id = time.strftime("%H%M%S")
+    stop = threading.Event()
+    prober = threading.Thread(target=probe_locks, name="loadtest-lock-probe", daemon=True,
+                              args=({"pharmacy": databases["PHARMACY_DB"], "hospital": databases["HOSPITAL_DB"]},
+                                    recorder, stop))
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    try:
+        with output:
+            # A first session creates the shared resources so they aren't counted against the load
+            simulate_user(Recorder(), run_id, "warmup", 1, args.timeout)
+            prober.start()
+            elapsed = run_load(recorder, run_id, args.users, args.iterations, args.timeout)
+            stop.set()
+            prober.join()
+            memory = None
+            if args.memory_sessions > 0:
+                memory = measure_session_memory(run_id, args.memory_sessions, args.iterations, args.timeout)
+    finally:
+        stop.set()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    lock_names = [name for name in recorder.timings if name == "app write lock" or name.startswith("sqlite ")]
+    reruns = sum(len(values) for name, values in recorder.timings.items() if name not in lock_names)
+    report = {
+        "users": args.users,
+        "iterations": args.iterations,
+        "elapsed_s": elapsed,
+        "reruns_per_s": reruns / elapsed,
+        "latency": {name: summarize(values) for name, values in recorder.timings.items() if name not in lock_names},
+        "lock_waits": {name: summarize(recorder.timings[name]) for name in lock_names},
+        "memory": memory,
+        "errors": recorder.errors,
+    }
+    print_report(report)
+    if args.keep:
+        print(f"\nDatabases kept in {workdir}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if recorder.errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
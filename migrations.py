@@ -0,0 +1,186 @@
+import json
+import re
+
+import alerts
+import reports
+import search
+
+COLUMN_TYPES = ["TEXT", "INTEGER", "REAL", "DATE", "BOOLEAN"]
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,62}$")
+
+CORE_COLUMNS = ["id", "medicine_name", "quantity", "manufacturer", "supplier", "supplier_price",
+                "batch_no", "exp_mfg_date", "amount", "paid"]
+# Columns maintained by the app itself that are never shown or edited directly
+INTERNAL_COLUMNS = {"attributes", "exp_date"}
+ATTRIBUTE_COLUMN_PREFIX = "attr_"
+
+BASE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS inventory
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+     medicine_name TEXT,
+     quantity INTEGER,
+     manufacturer TEXT,
+     supplier TEXT,
+     supplier_price REAL,
+     batch_no TEXT,
+     exp_mfg_date DATE,
+     amount REAL,
+     paid BOOLEAN);
+
+CREATE TABLE IF NOT EXISTS invoices
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+     invoice_no TEXT,
+     customer_name TEXT,
+     customer_phone TEXT,
+     total_amount REAL,
+     date DATE,
+     paid BOOLEAN);
+
+CREATE TABLE IF NOT EXISTS invoice_items
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+     invoice_id INTEGER,
+     medicine_name TEXT,
+     quantity INTEGER,
+     rate REAL,
+     total REAL,
+     FOREIGN KEY (invoice_id) REFERENCES invoices (id));
+'''
+
+ATTRIBUTE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS inventory_attributes
+    (name TEXT PRIMARY KEY,
+     type TEXT NOT NULL,
+     indexed BOOLEAN NOT NULL DEFAULT 0);
+'''
+
+
+def create_base_tables(conn):
+    conn.executescript(BASE_SCHEMA)
+
+
+def create_attribute_store(conn):
+    # A constant DEFAULT lets SQLite add the column without rewriting the table
+    columns = [row[1] for row in conn.execute("PRAGMA table_xinfo(inventory)")]
+    if "attributes" not in columns:
+        conn.execute("ALTER TABLE inventory ADD COLUMN attributes TEXT NOT NULL DEFAULT '{}'")
+    conn.executescript(ATTRIBUTE_SCHEMA)
+
+
+# Ordered list of (version, description, migration). Every migration is
+# idempotent, so a database that already has some of the objects (e.g. one
+# created before versioning existed) is brought up to date safely.
+MIGRATIONS = [
+    (1, "base inventory and invoice tables", create_base_tables),
+    (2, "dashboard summary tables", reports.init_reports),
+    (3, "medicine search index", search.init_search),
+    (4, "expiry index and alert tables", alerts.init_alerts),
+    (5, "dynamic inventory attributes", create_attribute_store),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Apply every migration newer than the database's user_version.
+
+    Returns the list of versions that were applied.
+    """
+    applied = []
+    for version, description, migration in MIGRATIONS:
+        if version <= schema_version(conn):
+            continue
+        print(f"Applying migration {version}: {description}")
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+        applied.append(version)
+    return applied
+
+
+def validate_attribute(name, column_type):
+    if not name or not IDENTIFIER.match(name):
+        raise ValueError("Column name must start with a letter or underscore and contain only letters, digits and underscores")
+    if column_type not in COLUMN_TYPES:
+        raise ValueError(f"Column type must be one of {', '.join(COLUMN_TYPES)}")
+
+
+class InventorySchema:
+    """
+    Registry of the inventory columns for one connection.
+
+    Core columns are real table columns, user-added attributes live in the
+    attributes JSON column. An indexed attribute also gets a virtual generated
+    column (attr_<name>) with an index on it, neither of which rewrites the
+    table. Column lists and the display query are cached until the schema changes.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._version = None
+        self._extra_columns = []
+        self._attributes = []
+        self._select_sql = None
+
+    def _refresh(self):
+        version = self.conn.execute("PRAGMA schema_version").fetchone()[0]
+        if version == self._version:
+            return
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_xinfo(inventory)")]
+        # Columns added with ALTER TABLE before the attribute store existed
+        self._extra_columns = [
+            col for col in columns
+            if col not in CORE_COLUMNS and col not in INTERNAL_COLUMNS
+            and not col.startswith(ATTRIBUTE_COLUMN_PREFIX)
+        ]
+        self._attributes = self.conn.execute(
+            "SELECT name, type, indexed FROM inventory_attributes ORDER BY rowid"
+        ).fetchall()
+        select_list = [f'"{col}"' for col in CORE_COLUMNS + self._extra_columns]
+        select_list += [f"json_extract(attributes, '$.{name}') AS \"{name}\"" for name, _, _ in self._attributes]
+        self._select_sql = f"SELECT {', '.join(select_list)} FROM inventory"
+        self._version = version
+
+    @property
+    def attributes(self):
+        """List of (name, type, indexed) for the user-added attributes."""
+        self._refresh()
+        return list(self._attributes)
+
+    @property
+    def extra_columns(self):
+        self._refresh()
+        return list(self._extra_columns)
+
+    @property
+    def select_sql(self):
+        """SELECT over inventory with every attribute flattened into its own column."""
+        self._refresh()
+        return self._select_sql
+
+    def add_attribute(self, name, column_type, indexed=False):
+        validate_attribute(name, column_type)
+        self._refresh()
+        taken = set(CORE_COLUMNS) | INTERNAL_COLUMNS | set(self._extra_columns)
+        taken |= {attr_name for attr_name, _, _ in self._attributes}
+        if name.lower() in {col.lower() for col in taken}:
+            raise ValueError(f"Column {name} already exists")
+
+        # Registered and created in one transaction, a failed ALTER TABLE leaves no orphan attribute row
+        with self.conn:
+            self.conn.execute("INSERT INTO inventory_attributes (name, type, indexed) VALUES (?, ?, ?)",
+                              (name, column_type, bool(indexed)))
+            if indexed:
+                column = ATTRIBUTE_COLUMN_PREFIX + name
+                self.conn.execute(f'ALTER TABLE inventory ADD COLUMN "{column}" {column_type} '
+                                  f"GENERATED ALWAYS AS (json_extract(attributes, '$.{name}')) VIRTUAL")
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_inventory_{column}" ON inventory ("{column}")')
+        # A non-indexed attribute is only a new row, which leaves schema_version unchanged
+        self._version = None
+
+    def dump_attributes(self, values):
+        """Serialize attribute values for the attributes column, dropping unknown keys."""
+        names = {name for name, _, _ in self.attributes}
+        return json.dumps({key: value for key, value in values.items() if key in names}, default=str)
@@ -2,9 +2,13 @@ import streamlit as st
 import sqlite3
 import pandas as pd
 
+from instance.she import get_database_snapshot
+
+DB_PATH = 'instance/hospital.db'
+
 def init_db():
     try:
-        conn = sqlite3.connect('instance/hospital.db', check_same_thread=False)
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
         c = conn.cursor()
         return conn, c
     except sqlite3.Error as e:
@@ -12,43 +16,33 @@ def init_db():
         return None, None
 
 def get_all_tables():
-    conn, c = init_db()
-    if conn and c:
-        c.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = c.fetchall()
-        return [table[0] for table in tables]
-    return []
+    # Table list and structure come from the precomputed schema snapshot
+    return list(get_database_snapshot(DB_PATH)['tables'])
 
 def _get_database_schema():
-    conn, c = init_db()
-    if conn and c:
-        c.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = c.fetchall()
+    tables = get_database_snapshot(DB_PATH)['tables']
+    if not tables:
+        return "No schema available."
+
+    schema = []
+    for table_name, table in tables.items():
+        schema.append("\n" + "="*50)
+        schema.append(f"Table: {table_name}")
+        schema.append("="*50)
         
-        schema = []
-        for table in tables:
-            table_name = table[0]
-            schema.append("\n" + "="*50)
-            schema.append(f"Table: {table_name}")
-            schema.append("="*50)
-            
-            c.execute(f"PRAGMA table_info({table_name});")
-            columns = c.fetchall()
-            
-            schema.append(f"{'Column Name':<20} {'Type':<15} {'Not Null':<10} {'Default':<15} {'Primary Key'}")
-            schema.append("-"*70)
-            
-            for col in columns:
-                col_name = col[1]
-                col_type = col[2]
-                not_null = "Yes" if col[3] else "No"
-                default_val = str(col[4]) if col[4] is not None else ""
-                primary_key = "Yes" if col[5] else "No"
-                
-                schema.append(f"{col_name:<20} {col_type:<15} {not_null:<10} {default_val:<15} {primary_key}")
+        schema.append(f"{'Column Name':<20} {'Type':<15} {'Not Null':<10} {'Default':<15} {'Primary Key'}")
+        schema.append("-"*70)
         
-        return "\n".join(schema)
-    return "No schema available."
+        for col in table['columns']:
+            col_name = col['name']
+            col_type = col['type']
+            not_null = "Yes" if col['not_null'] else "No"
+            default_val = str(col['default']) if col['default'] is not None else ""
+            primary_key = "Yes" if col['primary_key'] else "No"
+            
+            schema.append(f"{col_name:<20} {col_type:<15} {not_null:<10} {default_val:<15} {primary_key}")
+    
+    return "\n".join(schema)
 
 def view_database():
     tables = get_all_tables()
@@ -0,0 +1,187 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+
+QUERY_LOG_DB = os.environ.get("CHAT_QUERY_LOG_DB", "instance/chat_query_log.db")
+# A question template is answered locally once the same SQL was generated
+# for it this many times (and for most of its occurrences)
+MIN_TEMPLATE_HITS = 3
+# Every Nth match of a learned template is sent to the SQL model instead, a
+# different answer from the model demotes the template
+REVALIDATE_EVERY = 10
+
+# Literals lifted out of a question: quoted strings, ISO dates and numbers
+PARAM_PATTERN = re.compile(r"'([^']*)'|\"([^\"]*)\"|\b(\d{4}-\d{2}-\d{2})\b|(?<![\w.])(\d+(?:\.\d+)?)(?![\w.])")
+NUMBER = re.compile(r"^\d+(?:\.\d+)?$")
+PLACEHOLDER = re.compile(r":p(\d+)\b")
+# Questions relative to the current time get SQL with the date of when they
+# were asked baked in, so neither may become a template
+RELATIVE_TIME = re.compile(r"\b(?:today|tonight|yesterday|tomorrow|now|currently|recent|recently|latest|ago"
+                           r"|(?:this|last|next|past|previous|coming) (?:\{\d+\} )?(?:day|week|month|year|quarter)s?)\b")
+DATE_LITERAL = re.compile(r"'\d{4}(?:-\d{2}){0,2}'")
+
+LOG_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS query_log
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+     asked_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+     question TEXT,
+     template TEXT,
+     params TEXT,
+     sql TEXT,
+     sql_template TEXT,
+     from_template BOOLEAN);
+
+CREATE INDEX IF NOT EXISTS idx_query_log_template ON query_log (template, sql_template);
+
+CREATE TABLE IF NOT EXISTS query_templates
+    (template TEXT PRIMARY KEY,
+     sql_template TEXT NOT NULL,
+     hits INTEGER NOT NULL DEFAULT 0,
+     last_params TEXT,
+     last_used DATETIME);
+'''
+
+def normalize(question):
+    """
+    Split a question into a template key and its literal parameters, e.g.
+    "Appointments on 2024-05-01" -> ("appointments on {0}", ["2024-05-01"]).
+    """
+    params = []
+
+    def lift(match):
+        params.append(next(group for group in match.groups() if group is not None))
+        return f" {{{len(params) - 1}}} "
+
+    text = PARAM_PATTERN.sub(lift, question.strip())
+    text = re.sub(r"[^\w{} ]+", " ", text.lower())
+    return " ".join(text.split()), params
+
+def _literal_pattern(value):
+    if NUMBER.match(value):
+        return re.compile(r"(?<![\w.'])" + re.escape(value) + r"(?![\w.'])")
+    return re.compile("'" + re.escape(value.replace("'", "''")) + "'", re.IGNORECASE)
+
+def parametrize_sql(sql, params):
+    """
+    Replace each question parameter's literal in sql with a :pN placeholder.
+    Returns None unless every parameter occurs exactly once in sql, otherwise
+    the SQL can't safely be reused for other values.
+    """
+    if len(set(params)) != len(params):
+        return None
+    template = sql
+    for index, value in enumerate(params):
+        template, count = _literal_pattern(value).subn(f":p{index}", template)
+        if count != 1:
+            return None
+    return template
+
+def templatable(template, sql_template):
+    """Whether SQL learned for a question template stays valid for later questions."""
+    return (sql_template is not None and not RELATIVE_TIME.search(template)
+            and not DATE_LITERAL.search(sql_template))
+
+def render_sql(sql_template, params):
+    """Fill :pN placeholders with safely quoted literals."""
+    def literal(match):
+        value = params[int(match.group(1))]
+        if NUMBER.match(value):
+            return value
+        return "'" + value.replace("'", "''") + "'"
+    return PLACEHOLDER.sub(literal, sql_template)
+
+class QueryTemplates:
+    """
+    Learns frequent question templates from the chat query log.
+
+    Every answered SELECT is logged with its normalized question and
+    parametrized SQL. Once a template has reliably produced the same SQL it is
+    promoted, and later questions matching it get their SQL rendered locally
+    instead of asking the SQL model.
+    """
+
+    def __init__(self, db_path=QUERY_LOG_DB, min_hits=MIN_TEMPLATE_HITS, revalidate_every=REVALIDATE_EVERY):
+        self.db_path = db_path
+        self.min_hits = min_hits
+        self.revalidate_every = revalidate_every
+        self._lock = threading.Lock()
+        self._matches = {}
+        conn = self._connect()
+        try:
+            conn.executescript(LOG_SCHEMA)
+            self._templates = {template: sql_template for template, sql_template
+                               in conn.execute("SELECT template, sql_template FROM query_templates")
+                               if templatable(template, sql_template)}
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def match(self, question):
+        """Return the rendered SQL for question if it matches a learned template, else None."""
+        template, params = normalize(question)
+        with self._lock:
+            sql_template = self._templates.get(template)
+            if sql_template is None:
+                return None
+            self._matches[template] = self._matches.get(template, 0) + 1
+            if self._matches[template] % self.revalidate_every == 0:
+                # Left to the model, record() then checks its answer against the template
+                return None
+        return render_sql(sql_template, params)
+
+    def record(self, question, sql, from_template=False):
+        """Log an answered SELECT and promote its template once it is frequent enough."""
+        template, params = normalize(question)
+        sql_template = parametrize_sql(sql, params)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('''INSERT INTO query_log (question, template, params, sql, sql_template, from_template)
+                                VALUES (?, ?, ?, ?, ?, ?)''',
+                             (question, template, json.dumps(params), sql, sql_template, from_template))
+                if from_template:
+                    conn.execute('''UPDATE query_templates
+                                    SET hits = hits + 1, last_params = ?, last_used = CURRENT_TIMESTAMP
+                                    WHERE template = ?''', (json.dumps(params), template))
+                    return
+                with self._lock:
+                    learned = self._templates.get(template)
+                if learned is not None and learned != sql_template:
+                    print(f"Model no longer agrees with the template for '{template}', demoting it")
+                    conn.execute("DELETE FROM query_templates WHERE template = ?", (template,))
+                    with self._lock:
+                        self._templates.pop(template, None)
+                        self._matches.pop(template, None)
+                if not templatable(template, sql_template):
+                    return
+
+                count, total = conn.execute('''SELECT SUM(sql_template = ?), COUNT(*)
+                                               FROM query_log
+                                               WHERE template = ? AND NOT from_template''',
+                                            (sql_template, template)).fetchone()
+                if count >= self.min_hits and count * 2 > total:
+                    conn.execute('''INSERT INTO query_templates (template, sql_template, hits, last_params, last_used)
+                                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                                    ON CONFLICT (template) DO UPDATE
+                                    SET sql_template = excluded.sql_template, last_params = excluded.last_params,
+                                        last_used = excluded.last_used''',
+                                 (template, sql_template, count, json.dumps(params)))
+                    with self._lock:
+                        self._templates[template] = sql_template
+        finally:
+            conn.close()
+
+    def hot_queries(self, limit=10):
+        """Rendered SQL of the most used templates, with their latest parameters."""
+        conn = self._connect()
+        try:
+            rows = conn.execute('''SELECT template, sql_template, last_params FROM query_templates
+                                   ORDER BY hits DESC LIMIT ?''', (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [render_sql(sql_template, json.loads(last_params or "[]"))
+                for template, sql_template, last_params in rows if templatable(template, sql_template)]
@@ -0,0 +1,118 @@
+import itertools
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from connections import ConnectionPool
+
+REFRESH_INTERVAL_SECONDS = 60
+# Pages copied per backup step, the source is unlocked between steps so
+# writers are never held up for the whole copy
+BACKUP_PAGES_PER_STEP = 256
+
+_generations = itertools.count(1)
+
+class SnapshotReplica:
+    """
+    Read-only in-memory copies of a set of databases, refreshed periodically
+    with the sqlite3 backup API.
+
+    Each refresh copies into a fresh generation of in-memory databases and
+    swaps the connection pool over to it, so queries already running keep
+    their snapshot and new queries see the new one. The old generation is
+    freed once its last connection is returned.
+    """
+
+    def __init__(self, databases, refresh_interval=REFRESH_INTERVAL_SECONDS, pool_size=4):
+        self.databases = dict(databases)
+        self.refresh_interval = refresh_interval
+        self.pool_size = pool_size
+        self.refreshed_at = None
+        self.generation = None
+        self.pool = None
+        self._keepers = []
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name="chat-snapshot-refresh", daemon=True)
+        self._thread.start()
+
+    def refresh(self):
+        """Copy every database into a new in-memory generation and switch to it."""
+        with self._refresh_lock:
+            # The snapshot is as old as the moment the copy started
+            started_at = datetime.now()
+            generation = next(_generations)
+            uris = {}
+            keepers = []
+            for alias, path in self.databases.items():
+                uri = f"file:/chat_replica_{generation}_{alias}?vfs=memdb"
+                # The keeper connection holds the in-memory database open for the generation's lifetime
+                replica = sqlite3.connect(uri, uri=True, check_same_thread=False)
+                source = sqlite3.connect(path, timeout=30)
+                try:
+                    source.backup(replica, pages=BACKUP_PAGES_PER_STEP, sleep=0)
+                finally:
+                    source.close()
+                uris[alias] = uri
+                keepers.append(replica)
+
+            pool = ConnectionPool(uris, size=self.pool_size, read_only=True, uri=True)
+            with self._lock:
+                old_pool, old_keepers = self.pool, self._keepers
+                self.pool, self._keepers = pool, keepers
+                self.generation = generation
+                self.refreshed_at = started_at
+
+            if old_pool is not None:
+                old_pool.close()
+            for keeper in old_keepers:
+                keeper.close()
+
+    def request_refresh(self):
+        """Have the background thread refresh now instead of at its next interval."""
+        self._wake.set()
+
+    def age_seconds(self):
+        if self.refreshed_at is None:
+            return None
+        return (datetime.now() - self.refreshed_at).total_seconds()
+
+    @contextmanager
+    def connection(self):
+        """Read-only pooled connection to the current snapshot."""
+        # Check out under the lock so a refresh can't free the generation
+        # between picking the pool and attaching its databases
+        with self._lock:
+            pool = self.pool
+            conn = pool.acquire()
+        try:
+            yield conn
+        finally:
+            pool.release(conn)
+
+    def close(self):
+        """Stop refreshing and free the current generation once its connections are returned."""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        with self._refresh_lock, self._lock:
+            if self.pool is not None:
+                self.pool.close()
+            for keeper in self._keepers:
+                keeper.close()
+            self._keepers = []
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.refresh()
+            except sqlite3.Error as e:
+                print(f"Snapshot refresh failed: {e}")
@@ -0,0 +1,178 @@
+from datetime import date, timedelta
+
+import alerts
+
+# Summary tables read by the dashboard. They are kept up to date by the
+# triggers below so reports never have to scan invoices/invoice_items/inventory.
+SUMMARY_TABLES = '''
+CREATE TABLE IF NOT EXISTS daily_sales
+    (sale_date DATE,
+     medicine_name TEXT,
+     quantity INTEGER,
+     revenue REAL,
+     PRIMARY KEY (sale_date, medicine_name));
+
+CREATE TABLE IF NOT EXISTS supplier_stock_value
+    (supplier TEXT PRIMARY KEY,
+     quantity INTEGER,
+     cost_value REAL,
+     retail_value REAL);
+'''
+
+SUMMARY_TRIGGERS = '''
+CREATE TRIGGER IF NOT EXISTS trg_daily_sales_insert AFTER INSERT ON invoice_items
+BEGIN
+    INSERT INTO daily_sales (sale_date, medicine_name, quantity, revenue)
+    VALUES ((SELECT date FROM invoices WHERE id = NEW.invoice_id), NEW.medicine_name,
+            COALESCE(NEW.quantity, 0), COALESCE(NEW.total, 0))
+    ON CONFLICT (sale_date, medicine_name) DO UPDATE
+    SET quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_daily_sales_delete AFTER DELETE ON invoice_items
+BEGIN
+    UPDATE daily_sales
+    SET quantity = quantity - COALESCE(OLD.quantity, 0), revenue = revenue - COALESCE(OLD.total, 0)
+    WHERE sale_date = (SELECT date FROM invoices WHERE id = OLD.invoice_id)
+      AND medicine_name = OLD.medicine_name;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_daily_sales_update
+AFTER UPDATE OF invoice_id, medicine_name, quantity, total ON invoice_items
+BEGIN
+    UPDATE daily_sales
+    SET quantity = quantity - COALESCE(OLD.quantity, 0), revenue = revenue - COALESCE(OLD.total, 0)
+    WHERE sale_date = (SELECT date FROM invoices WHERE id = OLD.invoice_id)
+      AND medicine_name = OLD.medicine_name;
+
+    INSERT INTO daily_sales (sale_date, medicine_name, quantity, revenue)
+    VALUES ((SELECT date FROM invoices WHERE id = NEW.invoice_id), NEW.medicine_name,
+            COALESCE(NEW.quantity, 0), COALESCE(NEW.total, 0))
+    ON CONFLICT (sale_date, medicine_name) DO UPDATE
+    SET quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue;
+END;
+
+-- Moving an invoice to another date moves all of its items' sales with it
+CREATE TRIGGER IF NOT EXISTS trg_daily_sales_invoice_date AFTER UPDATE OF date ON invoices
+BEGIN
+    UPDATE daily_sales
+    SET quantity = quantity - (SELECT TOTAL(quantity) FROM invoice_items
+                               WHERE invoice_id = OLD.id AND medicine_name = daily_sales.medicine_name),
+        revenue = revenue - (SELECT TOTAL(total) FROM invoice_items
+                             WHERE invoice_id = OLD.id AND medicine_name = daily_sales.medicine_name)
+    WHERE sale_date = OLD.date
+      AND medicine_name IN (SELECT medicine_name FROM invoice_items WHERE invoice_id = OLD.id);
+
+    INSERT INTO daily_sales (sale_date, medicine_name, quantity, revenue)
+    SELECT NEW.date, medicine_name, TOTAL(quantity), TOTAL(total)
+    FROM invoice_items
+    WHERE invoice_id = NEW.id
+    GROUP BY medicine_name
+    ON CONFLICT (sale_date, medicine_name) DO UPDATE
+    SET quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stock_value_insert AFTER INSERT ON inventory
+BEGIN
+    INSERT INTO supplier_stock_value (supplier, quantity, cost_value, retail_value)
+    VALUES (COALESCE(NEW.supplier, ''), COALESCE(NEW.quantity, 0),
+            COALESCE(NEW.quantity * NEW.supplier_price, 0), COALESCE(NEW.quantity * NEW.amount, 0))
+    ON CONFLICT (supplier) DO UPDATE
+    SET quantity = quantity + excluded.quantity,
+        cost_value = cost_value + excluded.cost_value,
+        retail_value = retail_value + excluded.retail_value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stock_value_delete AFTER DELETE ON inventory
+BEGIN
+    UPDATE supplier_stock_value
+    SET quantity = quantity - COALESCE(OLD.quantity, 0),
+        cost_value = cost_value - COALESCE(OLD.quantity * OLD.supplier_price, 0),
+        retail_value = retail_value - COALESCE(OLD.quantity * OLD.amount, 0)
+    WHERE supplier = COALESCE(OLD.supplier, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stock_value_update AFTER UPDATE ON inventory
+BEGIN
+    UPDATE supplier_stock_value
+    SET quantity = quantity - COALESCE(OLD.quantity, 0),
+        cost_value = cost_value - COALESCE(OLD.quantity * OLD.supplier_price, 0),
+        retail_value = retail_value - COALESCE(OLD.quantity * OLD.amount, 0)
+    WHERE supplier = COALESCE(OLD.supplier, '');
+
+    INSERT INTO supplier_stock_value (supplier, quantity, cost_value, retail_value)
+    VALUES (COALESCE(NEW.supplier, ''), COALESCE(NEW.quantity, 0),
+            COALESCE(NEW.quantity * NEW.supplier_price, 0), COALESCE(NEW.quantity * NEW.amount, 0))
+    ON CONFLICT (supplier) DO UPDATE
+    SET quantity = quantity + excluded.quantity,
+        cost_value = cost_value + excluded.cost_value,
+        retail_value = retail_value + excluded.retail_value;
+END;
+'''
+
+
+def init_reports(conn):
+    """
+    Create the summary tables and their maintenance triggers.
+
+    The tables are backfilled from history only when they are first created,
+    after that the triggers keep them in sync with every write.
+    """
+    existing = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='daily_sales'"
+    ).fetchone()
+    conn.executescript(SUMMARY_TABLES)
+    conn.executescript(SUMMARY_TRIGGERS)
+    if not existing:
+        rebuild_summaries(conn)
+    conn.commit()
+
+
+def rebuild_summaries(conn):
+    """Recompute every summary table from scratch (full scan, use sparingly)."""
+    conn.execute("DELETE FROM daily_sales")
+    conn.execute('''INSERT INTO daily_sales (sale_date, medicine_name, quantity, revenue)
+                    SELECT inv.date, it.medicine_name, TOTAL(it.quantity), TOTAL(it.total)
+                    FROM invoice_items it JOIN invoices inv ON inv.id = it.invoice_id
+                    GROUP BY inv.date, it.medicine_name''')
+
+    conn.execute("DELETE FROM supplier_stock_value")
+    conn.execute('''INSERT INTO supplier_stock_value (supplier, quantity, cost_value, retail_value)
+                    SELECT COALESCE(supplier, ''), TOTAL(quantity),
+                           TOTAL(quantity * supplier_price), TOTAL(quantity * amount)
+                    FROM inventory
+                    GROUP BY COALESCE(supplier, '')''')
+    conn.commit()
+
+
+def daily_sales(conn, start_date, end_date):
+    return conn.execute('''SELECT sale_date, SUM(quantity) AS quantity, SUM(revenue) AS revenue
+                           FROM daily_sales
+                           WHERE sale_date BETWEEN ? AND ?
+                           GROUP BY sale_date
+                           ORDER BY sale_date''', (start_date, end_date)).fetchall()
+
+
+def top_medicines(conn, start_date, end_date, limit=10):
+    return conn.execute('''SELECT medicine_name, SUM(quantity) AS quantity, SUM(revenue) AS revenue
+                           FROM daily_sales
+                           WHERE sale_date BETWEEN ? AND ?
+                           GROUP BY medicine_name
+                           ORDER BY revenue DESC
+                           LIMIT ?''', (start_date, end_date, limit)).fetchall()
+
+
+def stock_value_by_supplier(conn):
+    return conn.execute('''SELECT supplier, quantity, cost_value, retail_value
+                           FROM supplier_stock_value
+                           WHERE quantity != 0
+                           ORDER BY cost_value DESC''').fetchall()
+
+
+def expiring_batches(conn, days=alerts.EXPIRY_WINDOW_DAYS, today=None):
+    # Local date, like the alert checks, so both agree on what has expired
+    horizon = (today or date.today()) + timedelta(days=int(days))
+    return conn.execute('''SELECT medicine_name, batch_no, supplier, exp_date, quantity
+                           FROM inventory
+                           WHERE exp_date <= ? AND quantity > 0
+                           ORDER BY exp_date''', (horizon.isoformat(),)).fetchall()
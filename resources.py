@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import threading
+
+import streamlit as st
+
+# Process-wide resources shared by every session. Each is created lazily on
+# first use and then reused across reruns and connected users, so a page load
+# only pays for what that page actually touches.
+
+PHARMACY_DB = os.environ.get("PHARMACY_DB", "pharmacy_inventory.db")
+HOSPITAL_DB = os.environ.get("HOSPITAL_DB", "instance/hospital.db")
+# Databases the chat page can query together, by the alias used in generated SQL
+CHAT_DATABASES = {"hospital": HOSPITAL_DB, "pharmacy": PHARMACY_DB}
+# Chat may read these but never write them, pharmacy writes go through the app and its write lock
+CHAT_READ_ONLY_DATABASES = {"pharmacy"}
+# Run chat SELECTs against a periodically refreshed in-memory snapshot
+CHAT_SNAPSHOT_MODE = os.environ.get("CHAT_SNAPSHOT_MODE", "0") == "1"
+CHAT_SNAPSHOT_INTERVAL = int(os.environ.get("CHAT_SNAPSHOT_INTERVAL", "60"))
+WKHTMLTOPDF_PATH = os.environ.get("WKHTMLTOPDF_PATH", "C:/Program Files/wkhtmltopdf/bin/wkhtmltopdf.exe")
+
+
+@st.cache_resource(show_spinner=False)
+def get_pharmacy_db():
+    """Shared pharmacy connection, migrated once per process."""
+    import alerts
+    import migrations
+
+    conn = sqlite3.connect(PHARMACY_DB, check_same_thread=False, timeout=30)
+    migrations.migrate(conn)
+    # Background near-expiry / low-stock checks
+    alerts.start_scheduler(PHARMACY_DB)
+    return conn
+
+
+@st.cache_resource(show_spinner=False)
+def get_pharmacy_write_lock():
+    """Serializes write transactions on the shared pharmacy connection."""
+    return threading.Lock()
+
+
+@st.cache_resource(show_spinner=False)
+def get_inventory_schema():
+    import migrations
+
+    return migrations.InventorySchema(get_pharmacy_db())
+
+
+@st.cache_resource(show_spinner=False)
+def get_pdf_config():
+    import pdfkit
+
+    return pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
+
+
+@st.cache_resource(show_spinner="Loading models...", on_release=lambda qa: qa.close())
+def get_hospital_qa():
+    """Shared model clients, schema catalog and connection pool for the chat page."""
+    from hospital_qa import HospitalDatabaseQA
+
+    return HospitalDatabaseQA(CHAT_DATABASES, snapshot_mode=CHAT_SNAPSHOT_MODE,
+                              refresh_interval=CHAT_SNAPSHOT_INTERVAL,
+                              read_only_databases=CHAT_READ_ONLY_DATABASES)
@@ -0,0 +1,186 @@
+import csv
+import hashlib
+import os
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+CACHE_DIR = os.environ.get("CHAT_RESULT_CACHE_DIR", ".chat_results")
+MAX_CACHE_BYTES = int(os.environ.get("CHAT_RESULT_CACHE_MB", "200")) * 1024 * 1024
+CHUNK_ROWS = 5000
+
+FORMATS = ["csv", "parquet"] if pa is not None else ["csv"]
+MIME_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+def _value_kinds(values):
+    return {type(value) for value in values if value is not None}
+
+def _arrow_type(kinds):
+    # SQLite columns are dynamically typed, pick one Arrow type from the first chunk
+    if not kinds or str in kinds:
+        return pa.string()
+    if kinds == {bytes}:
+        return pa.binary()
+    if float in kinds:
+        return pa.float64()
+    if kinds <= {int, bool}:
+        return pa.int64()
+    return pa.string()
+
+def _fits(kinds, arrow_type):
+    """Whether values of these Python types convert to arrow_type without losing data."""
+    if arrow_type == pa.string():
+        return True
+    if arrow_type == pa.binary():
+        return kinds <= {bytes}
+    if arrow_type == pa.float64():
+        return kinds <= {int, float, bool}
+    return kinds <= {int, bool}
+
+def _widen(kinds, arrow_type):
+    if arrow_type == pa.int64() and kinds <= {int, float, bool}:
+        return pa.float64()
+    return pa.string()
+
+def _column_array(values, arrow_type):
+    if arrow_type == pa.string():
+        values = [value if value is None or isinstance(value, str) else str(value) for value in values]
+    elif arrow_type != pa.binary():
+        values = [int(value) if isinstance(value, bool) else value for value in values]
+    return pa.array(values, type=arrow_type)
+
+class ResultCache:
+    """
+    On-disk cache of full query results, written in chunks of CHUNK_ROWS so a
+    large result never has to be held in memory as a Python list.
+
+    Entries are keyed by the SQL, the format and a data version supplied by the
+    caller, so a result is reused until the underlying data changes. The least
+    recently used files are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path_for(self, sql, data_version, fmt):
+        digest = hashlib.sha256(f"{data_version}\0{sql}".encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{digest}.{fmt}")
+
+    def get(self, sql, data_version, fmt):
+        path = self.path_for(sql, data_version, fmt)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)  # Mark as recently used for eviction
+        return path
+
+    def write(self, sql, data_version, fmt, cursor):
+        """Stream the rows of an executed cursor to the cache and return the file path."""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path_for(sql, data_version, fmt)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        columns = [description[0] for description in cursor.description]
+        try:
+            if fmt == "csv":
+                self._write_csv(tmp_path, columns, cursor)
+            else:
+                self._write_parquet(tmp_path, columns, cursor)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+        return path
+
+    def _write_csv(self, path, columns, cursor):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            while rows := cursor.fetchmany(CHUNK_ROWS):
+                writer.writerows(rows)
+
+    def _write_parquet(self, path, columns, cursor):
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        column_values = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+        schema = pa.schema([(name, _arrow_type(_value_kinds(values)))
+                            for name, values in zip(columns, column_values)])
+        writer = pq.ParquetWriter(path, schema)
+        try:
+            while rows:
+                column_values = [list(values) for values in zip(*rows)]
+                kinds = [_value_kinds(values) for values in column_values]
+                if not all(_fits(column_kinds, field.type) for column_kinds, field in zip(kinds, schema)):
+                    # A later chunk doesn't fit the types picked from the first one,
+                    # widen those columns and convert what was already written
+                    writer.close()
+                    schema = pa.schema([field if _fits(column_kinds, field.type)
+                                        else field.with_type(_widen(column_kinds, field.type))
+                                        for column_kinds, field in zip(kinds, schema)])
+                    writer = self._rewrite_parquet(path, schema)
+                writer.write_batch(pa.record_batch(
+                    [_column_array(values, field.type) for values, field in zip(column_values, schema)],
+                    schema=schema))
+                rows = cursor.fetchmany(CHUNK_ROWS)
+        finally:
+            writer.close()
+
+    def _rewrite_parquet(self, path, schema):
+        """Convert the parquet file at path to schema and return a writer open on it."""
+        old_path = f"{path}.old.tmp"
+        os.replace(path, old_path)
+        writer = pq.ParquetWriter(path, schema)
+        try:
+            for batch in pq.ParquetFile(old_path).iter_batches(batch_size=CHUNK_ROWS):
+                writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+        except Exception:
+            writer.close()
+            raise
+        finally:
+            os.remove(old_path)
+        return writer
+
+    def preview(self, path, limit):
+        """Return (columns, first limit rows) of a cached result without loading the rest."""
+        if path.endswith(".csv"):
+            with open(path, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                columns = next(reader)
+                rows = []
+                for row in reader:
+                    if len(rows) >= limit:
+                        break
+                    rows.append(tuple(row))
+            return columns, rows
+
+        parquet_file = pq.ParquetFile(path)
+        columns = parquet_file.schema_arrow.names
+        rows = []
+        for batch in parquet_file.iter_batches(batch_size=limit):
+            rows = [tuple(row.values()) for row in batch.to_pylist()]
+            break
+        return columns, rows
+
+    def evict(self):
+        """Delete least recently used results until the cache fits in max_bytes."""
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir)
+                       if entry.is_file() and not entry.name.endswith(".tmp")]
+        except FileNotFoundError:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,75 @@
+import re
+
+SEARCH_LIMIT = 20
+
+# External-content FTS5 index over inventory, the triggers keep it in sync
+# with every insert, update and delete on the inventory table.
+SEARCH_INDEX = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts USING fts5
+    (medicine_name, manufacturer, batch_no,
+     content='inventory', content_rowid='id', prefix='1 2 3');
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_insert AFTER INSERT ON inventory
+BEGIN
+    INSERT INTO inventory_fts (rowid, medicine_name, manufacturer, batch_no)
+    VALUES (NEW.id, NEW.medicine_name, NEW.manufacturer, NEW.batch_no);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_delete AFTER DELETE ON inventory
+BEGIN
+    INSERT INTO inventory_fts (inventory_fts, rowid, medicine_name, manufacturer, batch_no)
+    VALUES ('delete', OLD.id, OLD.medicine_name, OLD.manufacturer, OLD.batch_no);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_update AFTER UPDATE ON inventory
+BEGIN
+    INSERT INTO inventory_fts (inventory_fts, rowid, medicine_name, manufacturer, batch_no)
+    VALUES ('delete', OLD.id, OLD.medicine_name, OLD.manufacturer, OLD.batch_no);
+    INSERT INTO inventory_fts (rowid, medicine_name, manufacturer, batch_no)
+    VALUES (NEW.id, NEW.medicine_name, NEW.manufacturer, NEW.batch_no);
+END;
+'''
+
+RESULT_COLUMNS = ["id", "medicine_name", "manufacturer", "batch_no", "exp_mfg_date", "quantity", "amount"]
+
+
+def init_search(conn):
+    """Create the medicine search index, building it from inventory the first time."""
+    existing = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='inventory_fts'"
+    ).fetchone()
+    conn.executescript(SEARCH_INDEX)
+    if not existing:
+        conn.execute("INSERT INTO inventory_fts (inventory_fts) VALUES ('rebuild')")
+    conn.commit()
+
+
+def build_match_query(text):
+    # Every word becomes a quoted prefix term so user input can never be
+    # parsed as FTS5 syntax, e.g. "para 50" -> "para"* "50"*
+    terms = re.findall(r"\w+", text or "")
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_medicines(conn, text, limit=SEARCH_LIMIT):
+    """
+    Return the top matches for text as dicts with stock and price.
+
+    An empty search returns the most recently added items instead.
+    """
+    match = build_match_query(text)
+    if match:
+        rows = conn.execute('''SELECT i.id, i.medicine_name, i.manufacturer, i.batch_no,
+                                      i.exp_mfg_date, i.quantity, i.amount
+                               FROM inventory_fts
+                               JOIN inventory i ON i.id = inventory_fts.rowid
+                               WHERE inventory_fts MATCH ?
+                               ORDER BY rank
+                               LIMIT ?''', (match, limit)).fetchall()
+    else:
+        rows = conn.execute('''SELECT id, medicine_name, manufacturer, batch_no,
+                                      exp_mfg_date, quantity, amount
+                               FROM inventory
+                               ORDER BY id DESC
+                               LIMIT ?''', (limit,)).fetchall()
+    return [dict(zip(RESULT_COLUMNS, row)) for row in rows]
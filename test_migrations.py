@@ -0,0 +1,30 @@
+import json
+import sqlite3
+
+from migrations import InventorySchema, migrate
+
+
+def migrated_connection():
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    return conn
+
+
+def test_added_attribute_is_visible_to_the_same_schema():
+    schema = InventorySchema(migrated_connection())
+    assert schema.attributes == []
+
+    schema.add_attribute("cold", "BOOLEAN", False)
+    assert schema.attributes == [("cold", "BOOLEAN", 0)]
+    assert "json_extract(attributes, '$.cold') AS \"cold\"" in schema.select_sql
+    assert json.loads(schema.dump_attributes({"cold": True, "unknown": 1})) == {"cold": True}
+
+
+def test_indexed_attribute_gets_a_generated_column():
+    conn = migrated_connection()
+    schema = InventorySchema(conn)
+    schema.add_attribute("shelf", "TEXT", True)
+    conn.execute("INSERT INTO inventory (medicine_name, attributes) VALUES ('A', ?)",
+                 (schema.dump_attributes({"shelf": "B2"}),))
+    assert conn.execute('SELECT "attr_shelf" FROM inventory').fetchone() == ("B2",)
+    assert conn.execute(schema.select_sql).fetchone()[-1] == "B2"
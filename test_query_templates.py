@@ -0,0 +1,90 @@
+from query_templates import MIN_TEMPLATE_HITS, QueryTemplates, normalize, parametrize_sql, render_sql
+
+
+def test_normalize_lifts_literals():
+    assert normalize("Appointments on 2024-05-01?") == ("appointments on {0}", ["2024-05-01"])
+    template, params = normalize('Patients named "Smith" older than 65')
+    assert template == "patients named {0} older than {1}"
+    assert params == ["Smith", "65"]
+
+
+def test_normalize_ignores_digits_inside_words():
+    assert normalize("Beds in ward B12") == ("beds in ward b12", [])
+
+
+def test_parametrize_sql_replaces_each_literal():
+    sql = "SELECT * FROM patient WHERE lastname = 'Smith' AND age > 65"
+    assert parametrize_sql(sql, ["Smith", "65"]) == "SELECT * FROM patient WHERE lastname = :p0 AND age > :p1"
+
+
+def test_parametrize_sql_rejects_ambiguous_literals():
+    # The 1 of the question also appears as an unrelated constant
+    assert parametrize_sql("SELECT * FROM patient WHERE age > 1 AND active = 1", ["1"]) is None
+    assert parametrize_sql("SELECT * FROM patient WHERE age > 30", ["30", "30"]) is None
+
+
+def test_parametrize_sql_rejects_missing_literals():
+    assert parametrize_sql("SELECT * FROM patient WHERE age > 18", ["65"]) is None
+
+
+def test_parametrize_sql_does_not_match_inside_numbers():
+    assert parametrize_sql("SELECT * FROM patient WHERE age > 6 LIMIT 60", ["6"]) == \
+        "SELECT * FROM patient WHERE age > :p0 LIMIT 60"
+
+
+def test_render_sql_quotes_strings():
+    sql = render_sql("SELECT * FROM patient WHERE lastname = :p0 AND age > :p1", ["O'Neil", "65"])
+    assert sql == "SELECT * FROM patient WHERE lastname = 'O''Neil' AND age > 65"
+
+
+def test_render_sql_round_trip():
+    template = parametrize_sql("SELECT * FROM appointment WHERE appointment_date = '2024-05-01'", ["2024-05-01"])
+    assert render_sql(template, ["2024-06-02"]) == "SELECT * FROM appointment WHERE appointment_date = '2024-06-02'"
+
+
+def learned_templates(tmp_path, question, sql, **kwargs):
+    templates = QueryTemplates(str(tmp_path / "log.db"), **kwargs)
+    for _ in range(MIN_TEMPLATE_HITS):
+        templates.record(question, sql)
+    return templates
+
+
+def test_relative_time_questions_are_not_learned(tmp_path):
+    templates = learned_templates(tmp_path, "Today's appointments",
+                                  "SELECT * FROM appointment WHERE appointment_date = '2026-10-19'")
+    assert templates.match("Today's appointments") is None
+
+
+def test_sql_with_dates_not_in_the_question_is_not_learned(tmp_path):
+    templates = learned_templates(tmp_path, "Appointments so far",
+                                  "SELECT * FROM appointment WHERE appointment_date <= '2026-10-19'")
+    assert templates.match("Appointments so far") is None
+
+
+def test_dates_from_the_question_are_learned(tmp_path):
+    templates = learned_templates(tmp_path, "Appointments on 2026-10-19",
+                                  "SELECT * FROM appointment WHERE appointment_date = '2026-10-19'")
+    assert templates.match("Appointments on 2026-10-20") == \
+        "SELECT * FROM appointment WHERE appointment_date = '2026-10-20'"
+
+
+def test_every_nth_match_is_revalidated_by_the_model(tmp_path):
+    sql = "SELECT * FROM patient WHERE age > 65"
+    templates = learned_templates(tmp_path, "Patients older than 65", sql, revalidate_every=3)
+    assert templates.match("Patients older than 65") == sql
+    assert templates.match("Patients older than 65") == sql
+    assert templates.match("Patients older than 65") is None
+    # The model agrees, so the template is kept
+    templates.record("Patients older than 65", sql)
+    assert templates.match("Patients older than 65") == sql
+
+
+def test_template_is_demoted_when_the_model_disagrees(tmp_path):
+    question = "Patients older than 65"
+    templates = learned_templates(tmp_path, question, "SELECT * FROM patient WHERE age > 65", revalidate_every=1)
+    assert templates.match(question) is None
+    templates.record(question, "SELECT firstname FROM patient WHERE age > 65")
+    templates.revalidate_every = 10
+    assert templates.match(question) is None
+    # Demotion survives a restart
+    assert QueryTemplates(str(tmp_path / "log.db")).match(question) is None